@@ -2,6 +2,7 @@
 ASGI config for mysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with any ASGI server, for example ``uvicorn mysite.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -12,5 +13,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+# serve the read-only pages with their async views (see polls.async_views)
+os.environ.setdefault('POLLS_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
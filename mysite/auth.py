@@ -0,0 +1,60 @@
+"""
+Loading the logged in user of a request from the cache.
+
+AuthenticationMiddleware reads the User row on every request. With
+AUTH_USER_CACHE_TIMEOUT set, CachedAuthenticationMiddleware keeps the
+user in the cache for that many seconds, under a key made of their id,
+the session auth hash of the session and a version stamp that is bumped
+when the user is saved or deleted (see polls.signals). A session whose
+hash was checked once is served from the cache until the stamp changes,
+so that a deactivated user, or a changed password, is seen by the next
+request. The stamp is only seen by every process with a cache they share,
+which mysite.checks requires.
+"""
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+
+USER_VERSION_KEY = 'auth:user:{}:version'
+USER_KEY = 'auth:user:{}:{}:{}'
+
+
+def user_version(user_id):
+    """Return the version stamp of the cached copies of a user."""
+    key = USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_user(user_id):
+    """Forget the cached copies of a user once the transaction commits."""
+    key = USER_VERSION_KEY.format(user_id)
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+def get_user(request):
+    """
+    Return the user of the session of `request`, from the cache if it was
+    loaded by an earlier request of the same session.
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+    key = USER_KEY.format(user_id, user_version(user_id),
+                          session.get(auth.HASH_SESSION_KEY, ''))
+    user = cache.get(key)
+    if user is None:
+        # checks the backend and the session hash, and logs out on failure
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
@@ -0,0 +1,40 @@
+"""
+System checks of the site settings.
+
+The default LocMemCache keeps its values in each process. Sessions kept
+in the cache, and users cached by mysite.auth, are then only dropped
+from the process that logged out or changed the user: the other worker
+processes go on serving the old session or user until it expires from
+their cache. Those settings need a cache shared by every process, such
+as Redis or Memcached. A single process, like the development server,
+may silence the errors with SILENCED_SYSTEM_CHECKS.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+from polls.tiered import is_process_local
+
+SHARED_CACHE_HINT = ('Set CACHE_BACKEND to a cache shared by the worker '
+                     'processes, such as Redis or Memcached.')
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Refuse the settings that need a shared cache with a local one."""
+    if not is_process_local(caches['default']):
+        return []
+    errors = []
+    if settings.SESSION_PROFILE in ('cache', 'cached_db'):
+        errors.append(checks.Error(
+            f'SESSION_PROFILE={settings.SESSION_PROFILE} needs a cache '
+            'shared by the processes: a logout in one would not end the '
+            'session in the others.',
+            hint=SHARED_CACHE_HINT, id='mysite.E001'))
+    if settings.AUTH_USER_CACHE_TIMEOUT:
+        errors.append(checks.Error(
+            'AUTH_USER_CACHE_TIMEOUT needs a cache shared by the '
+            'processes: a deactivated user or a changed password would '
+            'not be seen by the others.',
+            hint=SHARED_CACHE_HINT, id='mysite.E002'))
+    return errors
@@ -0,0 +1,16 @@
+"""Password hashers of the mysite project."""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with PASSWORD_PBKDF2_ITERATIONS iterations,
+    or Django's own count when it is 0. Hashes made with another count
+    still check, and are updated to the current one at the next login.
+    """
+
+    @property
+    def iterations(self):
+        return (settings.PASSWORD_PBKDF2_ITERATIONS
+                or hashers.PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,336 @@
+"""
+Counters and histograms of the site, exported in the Prometheus text
+format on /metrics.
+
+Every process adds its values to one store, a small table of (key,
+float) entries in a buffer, under a lock held only for the addition.
+With METRICS_DIR set the stores are memory-mapped files, `<pid>.db`, and
+/metrics adds up every file of the directory, so that it shows the
+values of all the worker processes whichever of them serves it. The
+files of stopped processes are kept so that counters never go back;
+empty the directory when the whole site restarts. Without METRICS_DIR
+the store is in memory and /metrics shows the values of its process.
+"""
+import asyncio
+import bisect
+import functools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.dispatch import receiver
+
+_HEADER = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 1 << 16
+
+# seconds, from a cached page to a slow vote
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def _entries(buffer):
+    """Yield the (key, value) entries of the buffer of a store."""
+    if len(buffer) < _HEADER.size:
+        return
+    used, = _HEADER.unpack_from(buffer, 0)
+    offset = _HEADER.size
+    while offset < used:
+        length, = _LENGTH.unpack_from(buffer, offset)
+        key = bytes(buffer[offset + _LENGTH.size:
+                           offset + _LENGTH.size + length]).decode()
+        offset = _value_offset(offset, length)
+        value, = _VALUE.unpack_from(buffer, offset)
+        yield key, value
+        offset += _VALUE.size
+
+
+def _value_offset(offset, length):
+    # values are aligned on 8 bytes so that they are written in one go
+    end = offset + _LENGTH.size + length
+    return end + -end % 8
+
+
+class Store:
+    """
+    The values written by one process, in memory or in a file that other
+    processes read. Entries are only ever appended, and the used size in
+    the header is written last, so that a reader never sees half of one.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pid = os.getpid()
+        self._offsets = {}
+        self._lock = threading.Lock()
+        if path is None:
+            self._file = None
+            self._buffer = bytearray(_INITIAL_SIZE)
+        else:
+            self._file = open(path, 'a+b')
+            if os.fstat(self._file.fileno()).st_size < _INITIAL_SIZE:
+                self._file.truncate(_INITIAL_SIZE)
+            self._buffer = mmap.mmap(self._file.fileno(), 0)
+        if _HEADER.unpack_from(self._buffer, 0)[0] == 0:
+            _HEADER.pack_into(self._buffer, 0, _HEADER.size)
+        # a process reusing the pid of an ended one goes on from its values
+        offset = _HEADER.size
+        for key, _ in _entries(self._buffer):
+            self._offsets[key] = _value_offset(offset, len(key.encode()))
+            offset = self._offsets[key] + _VALUE.size
+
+    def add(self, key, amount):
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+            value, = _VALUE.unpack_from(self._buffer, offset)
+            _VALUE.pack_into(self._buffer, offset, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        used, = _HEADER.unpack_from(self._buffer, 0)
+        offset = _value_offset(used, len(encoded))
+        end = offset + _VALUE.size
+        if end > len(self._buffer):
+            self._grow(max(end, 2 * len(self._buffer)))
+        _LENGTH.pack_into(self._buffer, used, len(encoded))
+        self._buffer[used + _LENGTH.size:
+                     used + _LENGTH.size + len(encoded)] = encoded
+        _VALUE.pack_into(self._buffer, offset, 0.0)
+        _HEADER.pack_into(self._buffer, 0, end)
+        self._offsets[key] = offset
+        return offset
+
+    def _grow(self, size):
+        if self._file is None:
+            self._buffer.extend(bytes(size - len(self._buffer)))
+        else:
+            self._buffer.close()
+            self._file.truncate(size)
+            self._buffer = mmap.mmap(self._file.fileno(), 0)
+
+    def entries(self):
+        with self._lock:
+            return list(_entries(self._buffer))
+
+
+class Registry:
+    """The metrics of the site and the stores of their values."""
+
+    def __init__(self):
+        self.metrics = []
+        # by METRICS_DIR, of the process in self._pid
+        self._stores = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # a thread of the parent may hold the lock while it forks
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def store(self):
+        """Return the store of the current process."""
+        directory = settings.METRICS_DIR
+        store = self._stores.get(directory)
+        # a forked worker must not write to the files of its parent
+        if store is None or store.pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._stores, self._pid = {}, os.getpid()
+                store = self._stores.get(directory)
+                if store is None:
+                    path = None
+                    if directory:
+                        path = os.path.join(directory, f'{self._pid}.db')
+                    store = self._stores[directory] = Store(path)
+        return store
+
+    def collect(self):
+        """Return the values of every store added up, by key."""
+        values = defaultdict(float)
+        directory = settings.METRICS_DIR
+        if directory:
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.db'):
+                    continue
+                with open(os.path.join(directory, name), 'rb') as file:
+                    for key, value in _entries(file.read()):
+                        values[key] += value
+        else:
+            store = self._stores.get(directory)
+            if store is not None and store.pid == os.getpid():
+                for key, value in store.entries():
+                    values[key] += value
+        return values
+
+    def exposition(self):
+        """Return the values of every metric in the Prometheus format."""
+        samples = defaultdict(list)
+        for key, value in self.collect().items():
+            name, suffix, labels = json.loads(key)
+            samples[name].append((suffix, labels, value))
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.lines(samples[metric.name]))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _format(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"')
+               .replace('\n', r'\n') for value in labels.values())
+    return '{%s}' % ','.join(f'{name}="{value}"'
+                             for name, value in zip(labels, escaped))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        registry.register(self)
+
+    def _add(self, suffix, labels, amount):
+        key = json.dumps([self.name, suffix, dict(sorted(labels.items()))])
+        self.registry.store().add(key, amount)
+
+
+class Counter(Metric):
+    """A count that only goes up, such as the number of votes."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._add('', labels, amount)
+
+    def lines(self, samples):
+        for _, labels, value in sorted(samples, key=lambda s: str(s[1])):
+            yield f'{self.name}{_labels(labels)} {_format(value)}'
+
+
+class Histogram(Metric):
+    """Values counted in buckets, such as the latency of a page."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS,
+                 registry=registry):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # only the bucket of the value is counted, exposition() adds up
+        # the buckets below each bound
+        index = bisect.bisect_left(self.buckets, value)
+        self._add('bucket', {**labels, 'le': index}, 1)
+        self._add('sum', labels, value)
+
+    def lines(self, samples):
+        series = defaultdict(lambda: {'bucket': defaultdict(float),
+                                      'sum': 0.0})
+        for suffix, labels, value in samples:
+            if suffix == 'bucket':
+                index = labels.pop('le')
+                series[json.dumps(labels)]['bucket'][index] += value
+            else:
+                series[json.dumps(labels)]['sum'] += value
+        for key in sorted(series):
+            labels, counts = json.loads(key), series[key]
+            total = 0.0
+            bounds = [*map(repr, self.buckets), '+Inf']
+            for index, bound in enumerate(bounds):
+                total += counts['bucket'][index]
+                yield (f'{self.name}_bucket{_labels({**labels, "le": bound})}'
+                       f' {_format(total)}')
+            yield f'{self.name}_sum{_labels(labels)} {_format(counts["sum"])}'
+            yield f'{self.name}_count{_labels(labels)} {_format(total)}'
+
+
+REQUEST_LATENCY = Histogram('polls_request_duration_seconds',
+                            'Time taken to answer a request, by view.')
+VOTES = Counter('polls_votes_total',
+                'Votes cast, by outcome: new, changed, unchanged or queued.')
+CACHE_REQUESTS = Counter('polls_cache_requests_total',
+                         'Lookups of the tiered caches, by cache, tier '
+                         '(local or shared) and result (hit or miss).')
+CACHE_EVICTIONS = Counter('polls_cache_evictions_total',
+                          'Values dropped from the local tier of the '
+                          'tiered caches, by cache.')
+SIGNUPS = Counter('auth_signups_total', 'Users who signed up.')
+LOGINS = Counter('auth_logins_total', 'Successful logins.')
+LOGIN_FAILURES = Counter('auth_login_failures_total',
+                         'Logins refused for a wrong username or password.')
+AUTH_THROTTLED = Counter('auth_throttled_total',
+                         'Signups and logins refused by the rate limit, '
+                         'by scope.')
+
+
+def timed(view_name):
+    """Decorate a view to record its latency under `view_name`."""
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await view(*args, **kwargs)
+                finally:
+                    REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                            view=view_name)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                            view=view_name)
+        return wrapper
+    return decorator
+
+
+class TimedViewMixin:
+    """Record the latency of a class-based view under `metrics_name`."""
+
+    metrics_name = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return timed(cls.metrics_name)(super().as_view(**initkwargs))
+
+
+@receiver(user_logged_in)
+def count_login(sender, **kwargs):
+    LOGINS.inc()
+
+
+@receiver(user_login_failed)
+def count_login_failure(sender, **kwargs):
+    LOGIN_FAILURES.inc()
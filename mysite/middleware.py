@@ -0,0 +1,204 @@
+"""Middleware of the mysite project."""
+import contextvars
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .auth import get_user
+from .routers import pinned_to_primary
+
+PIN_COOKIE = 'pin_primary'
+
+query_logger = logging.getLogger('mysite.queries')
+
+
+class ReplicaPinMiddleware:
+    """
+    Send the queries of a user who has just written to the primary
+    database, so that the lag of the replica cannot hide their write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        if pinned:
+            with pinned_to_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        if getattr(request, 'pin_to_primary', False):
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds),
+                                max_age=seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Load request.user from the cache when AUTH_USER_CACHE_TIMEOUT is set
+    (see mysite.auth), else from the database like its base class.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        if settings.AUTH_USER_CACHE_TIMEOUT:
+            request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a view runs more queries than its budget allows. It is an
+    AssertionError so that a test requesting the view fails.
+    """
+
+
+class RequestQueries:
+    """The queries and the template rendering time of one request."""
+
+    def __init__(self):
+        self.queries = []
+        self.render_time = 0.0
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params),
+                                 time.perf_counter() - start))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """Queries run again with the same parameters."""
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    @property
+    def similar(self):
+        """
+        Queries run again with other parameters, the mark of a query made
+        in a loop (N+1).
+        """
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    def most_repeated(self):
+        """Return the SQL run most often and how often."""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return counts.most_common(1)[0] if counts else (None, 0)
+
+
+_current = contextvars.ContextVar('request_queries', default=None)
+
+
+@contextmanager
+def timed_rendering():
+    """
+    Add the time spent rendering a template in the block to the current
+    request (see mysite.templating).
+    """
+    recorder = _current.get()
+    # a template rendered while another is, such as a fragment rendered
+    # by a context value, is timed with the outer one
+    if recorder is None or recorder._rendering:
+        yield
+        return
+    recorder._rendering = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.render_time += time.perf_counter() - start
+        recorder._rendering = False
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Count the queries of every request, the time they take, the queries
+    run more than once and the time spent rendering templates, and report
+    them in a Server-Timing header and a log line of 'mysite.queries'.
+    A view running more queries than its budget (QUERY_BUDGETS by view
+    name, else QUERY_BUDGET) is logged as a warning, or fails with
+    QueryBudgetExceeded when QUERY_BUDGET_ACTION is 'raise'. Only used
+    when QUERY_INSTRUMENTATION is on.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = RequestQueries()
+        token = _current.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else None
+        self.report(request, response, view, recorder, total)
+        self.check_budget(view, recorder)
+        return response
+
+    def report(self, request, response, view, recorder, total):
+        count = len(recorder.queries)
+        sql_time = recorder.sql_time
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={sql_time * 1000:.2f};desc="{count} queries"',
+            f'dup;desc="{recorder.duplicates} duplicate, '
+            f'{recorder.similar} similar"',
+            f'render;dur={recorder.render_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        stats = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': count,
+            'sql_ms': round(sql_time * 1000, 2),
+            'duplicates': recorder.duplicates,
+            'similar': recorder.similar,
+            'render_ms': round(recorder.render_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        query_logger.info(' '.join(f'{key}={value}'
+                                   for key, value in stats.items()),
+                          extra={'query_stats': stats})
+
+    def check_budget(self, view, recorder):
+        budget = settings.QUERY_BUDGETS.get(view, settings.QUERY_BUDGET)
+        count = len(recorder.queries)
+        if not budget or count <= budget:
+            return
+        sql, times = recorder.most_repeated()
+        message = (f'{view} ran {count} queries, its budget is {budget}; '
+                   f'run {times} times: {sql}')
+        if settings.QUERY_BUDGET_ACTION == 'raise':
+            raise QueryBudgetExceeded(message)
+        query_logger.warning(message)
@@ -0,0 +1,139 @@
+"""
+Fixed windows bounding how often a client may sign up or log in.
+
+Every client has a counter per scope and window of time, which allows
+AUTH_RATE_LIMIT_BURST POSTs in a window as long as it takes to earn
+them back at AUTH_RATE_LIMIT_PER_MINUTE a minute. Each POST counts, so
+that the password hashing a client can cause is bounded; past the limit
+it is answered with 429 Too Many Requests until the window ends. The
+counters live in the cache, which the worker processes share with a
+shared cache backend, and are only moved with cache.add() and
+cache.incr(), which are atomic there: two requests at the same instant
+never both take the last attempt. A client can make up to twice the
+burst across the end of a window, which is close enough for a bound on
+CPU work.
+
+Clients are told apart by the address in the request META key
+AUTH_RATE_LIMIT_CLIENT_HEADER, REMOTE_ADDR by default. Behind proxies,
+set it to HTTP_X_FORWARDED_FOR and AUTH_RATE_LIMIT_TRUSTED_PROXIES to
+the number of proxies that append to it.
+"""
+import asyncio
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .metrics import AUTH_THROTTLED
+
+WINDOW_KEY = 'ratelimit:{}:{}:{}'
+
+
+def client_address(request):
+    """
+    Return the address the client of `request` is limited by. A list of
+    addresses, as in X-Forwarded-For, is read from the right: only those
+    appended by the trusted proxies are to be believed.
+    """
+    value = request.META.get(settings.AUTH_RATE_LIMIT_CLIENT_HEADER, '')
+    addresses = [address.strip() for address in value.split(',')
+                 if address.strip()]
+    if not addresses:
+        # a request that did not come through the proxies
+        return request.META.get('REMOTE_ADDR')
+    trusted = settings.AUTH_RATE_LIMIT_TRUSTED_PROXIES
+    return addresses[max(0, len(addresses) - max(trusted, 1))]
+
+
+class FixedWindow:
+    """
+    The counters of a scope, `limit` attempts in every window of
+    `limit / per_second` seconds, or ever without `per_second`.
+    """
+
+    def __init__(self, scope, limit, per_second):
+        self.scope = scope
+        self.limit = limit
+        self.window = limit / per_second if per_second else None
+
+    @classmethod
+    def from_settings(cls, scope):
+        return cls(scope, settings.AUTH_RATE_LIMIT_BURST,
+                   settings.AUTH_RATE_LIMIT_PER_MINUTE / 60)
+
+    def _window(self, client, now):
+        """Return the key of the counter, its timeout and when it ends."""
+        if self.window is None:
+            return WINDOW_KEY.format(self.scope, client, 0), None, math.inf
+        index = math.floor(now / self.window)
+        end = (index + 1) * self.window
+        return (WINDOW_KEY.format(self.scope, client, index),
+                math.ceil(end - now) + 1, end)
+
+    def _wait(self, count, end, now):
+        return 0.0 if count <= self.limit else end - now
+
+    def take(self, client):
+        """Count an attempt of `client`, return 0 or the seconds to wait."""
+        now = time.time()
+        key, timeout, end = self._window(client, now)
+        cache.add(key, 0, timeout)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # the counter expired in between, this is the next window
+            cache.add(key, 0, timeout)
+            count = cache.incr(key)
+        return self._wait(count, end, now)
+
+    async def atake(self, client):
+        """Async version of take()."""
+        now = time.time()
+        key, timeout, end = self._window(client, now)
+        await cache.aadd(key, 0, timeout)
+        try:
+            count = await cache.aincr(key)
+        except ValueError:
+            await cache.aadd(key, 0, timeout)
+            count = await cache.aincr(key)
+        return self._wait(count, end, now)
+
+
+def too_many_requests(scope, wait):
+    AUTH_THROTTLED.inc(scope=scope)
+    retry_after = math.ceil(wait) if math.isfinite(wait) else 3600
+    response = HttpResponse(
+        f'Too many attempts, try again in {retry_after} seconds.',
+        status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(scope):
+    """Decorate a view to limit the POSTs of every client in `scope`."""
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method == 'POST' \
+                        and settings.AUTH_RATE_LIMIT_BURST:
+                    wait = await FixedWindow.from_settings(scope)\
+                        .atake(client_address(request))
+                    if wait:
+                        return too_many_requests(scope, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method == 'POST' \
+                        and settings.AUTH_RATE_LIMIT_BURST:
+                    wait = FixedWindow.from_settings(scope)\
+                        .take(client_address(request))
+                    if wait:
+                        return too_many_requests(scope, wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
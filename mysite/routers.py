@@ -0,0 +1,59 @@
+"""
+Database router sending reads to a replica and writes to the primary.
+
+Reads go to the 'replica' database when one is configured. Views that
+write are wrapped in `pin_to_primary`, which sends all their queries to
+the primary and makes ReplicaPinMiddleware keep that user's requests on
+the primary for REPLICA_PIN_SECONDS, so that they read their own vote, or
+the session of their login, even while the replica lags behind.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
+
+
+class pinned_to_primary:
+    """Context manager sending every query inside it to the primary."""
+
+    def __enter__(self):
+        self._token = _pinned.set(True)
+
+    def __exit__(self, *exc_info):
+        _pinned.reset(self._token)
+
+
+def pin_to_primary(view):
+    """Run `view` on the primary and pin its user there for a while."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with pinned_to_primary():
+            response = view(request, *args, **kwargs)
+        if request.method == 'POST':
+            request.pin_to_primary = True
+        return response
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """Route reads to the replica unless pinned, writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _pinned.get() or REPLICA not in settings.DATABASES:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,25 @@
+"""
+Template engine of the site: Django's, with the time spent rendering
+its templates added to the current request by
+QueryInstrumentationMiddleware. Templates included or extended by
+another are rendered within it and timed with it.
+"""
+from django.template.backends import django
+
+from .middleware import timed_rendering
+
+
+class Template(django.Template):
+
+    def render(self, context=None, request=None):
+        with timed_rendering():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -23,7 +23,10 @@ from . import views
 urlpatterns = [
     path('', RedirectView.as_view(url='polls')),
     path('polls/', include('polls.urls')),
+    path('accounts/login/', views.login_view, name='login'),
+    path('accounts/logout/', views.logout_view, name='logout'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('signup/', views.signup, name='signup'),
+    path('metrics', views.metrics, name='metrics'),
     path('admin/', admin.site.urls),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
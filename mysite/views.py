@@ -1,20 +1,35 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, authenticate
+from django.contrib.auth import login
+from django.contrib.auth import views as auth_views
 from django.contrib.auth.forms import UserCreationForm
 
+from .metrics import SIGNUPS, registry, timed
+from .ratelimit import rate_limited
+from .routers import pin_to_primary
 
+# they write the session, and the user's last_login, on the primary; the
+# next requests read them there too, not from a replica behind
+login_view = rate_limited('login')(
+    pin_to_primary(auth_views.LoginView.as_view()))
+logout_view = pin_to_primary(auth_views.LogoutView.as_view())
+
+
+@timed('signup')
+@rate_limited('signup')
+@pin_to_primary
 def signup(request):
     """Register a new user."""
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
-            form.save()
-            # get named fields from the form data
-            username = form.cleaned_data.get('username')
-            # password input field is named 'password1'
-            raw_passwd = form.cleaned_data.get('password1')
-            user = authenticate(username=username,password=raw_passwd)
-            login(request, user)
+            # the password was just hashed by the form, log the new user
+            # in without checking it, which would hash it again
+            user = form.save()
+            login(request, user,
+                  backend='django.contrib.auth.backends.ModelBackend')
+            SIGNUPS.inc()
             return redirect('/')
         # what if form is not valid?
         # we should display a message in signup.html
@@ -22,3 +37,12 @@ def signup(request):
         # create a user form and display it the signup page
         form = UserCreationForm()
     return render(request, 'registration/signup.html', {'form': form})
+
+
+def metrics(request):
+    """Serve the metrics of every worker process to Prometheus."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -1,11 +1,72 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
-from .models import Question, Choice
+from .models import Question, Choice, Vote
+
+
+def estimated_count(model, using):
+    """
+    Return an estimate of the number of rows of the table of `model`
+    without counting them, or None if the database cannot tell.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # kept up to date by autovacuum, -1 before the first ANALYZE
+            cursor.execute('SELECT reltuples::bigint FROM pg_class '
+                           'WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # the highest rowid, an overestimate once rows are deleted
+            cursor.execute('SELECT MAX(_rowid_) FROM '
+                           f'{connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Pages of a changelist that never count a whole large table: the
+    number of rows of an unfiltered list is the estimate of the database,
+    and a filtered list is counted up to `ceiling` rows. Past it the
+    estimate of the table stands in for the count, so that every page
+    stays reachable; the pages past the last row are empty. `approximate`
+    tells whether the count is an estimate.
+    """
+
+    ceiling = 10_000
+    approximate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            # small tables are counted, it is cheap and exact
+            if estimate is not None and estimate > self.ceiling:
+                self.approximate = True
+                return estimate
+        count = queryset[:self.ceiling + 1].count()
+        if count <= self.ceiling:
+            return count
+        estimate = estimated_count(queryset.model, queryset.db)
+        if estimate is None:
+            # nothing to bound the pages by but the whole count
+            return queryset.count()
+        self.approximate = True
+        return max(count, estimate)
 
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
     extra = 3
+    readonly_fields = ['vote_count']
 
 
 class QuestionAdmin(admin.ModelAdmin):
@@ -18,9 +79,34 @@ class QuestionAdmin(admin.ModelAdmin):
     ]
     inlines = [ChoiceInline]
     list_display = ('question_text', 'pub_date',
-                    'end_date', 'was_published_recently')
+                    'end_date', 'was_published_recently', 'total_votes')
+    # both dates are indexed
     list_filter = ['pub_date', 'end_date']
     search_fields = ['question_text']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """Add the total votes of every question, from its counters."""
+        return super().get_queryset(request).annotate(
+            total_votes=Coalesce(Sum('choice__vote_count'), 0))
+
+    @admin.display(ordering='total_votes', description='Votes')
+    def total_votes(self, question):
+        return question.total_votes
+
+
+class VoteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'question', 'choice')
+    list_select_related = ('user', 'question', 'choice')
+    raw_id_fields = ('user', 'choice')
+    # set from the choice when the vote is saved
+    readonly_fields = ('question',)
+    # exact matches, which use the unique index of the username
+    search_fields = ['=user__username']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Question, QuestionAdmin)
+admin.site.register(Vote, VoteAdmin)
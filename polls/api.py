@@ -0,0 +1,126 @@
+"""
+This module contains the JSON API of the application.
+
+The results of a question carry an ETag and a Last-Modified header made
+from the version of its results, so clients polling them get a 304 Not
+Modified answer, without any counting, until a vote is committed. They
+do not depend on the user, so shared caches may keep them (see
+polls.http).
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+from mysite.metrics import VOTES
+from mysite.routers import pin_to_primary
+
+from .cache import published_questions
+from .http import make_etag, not_modified, shared_results, version_time
+from .ingest import get_vote_queue
+from .models import Choice, Question
+from .pagination import InvalidCursor
+from .services import cast_vote, question_results
+
+
+def error(message, status):
+    """Return a JSON error answer."""
+    return JsonResponse({'error': message}, status=status)
+
+
+def question_data(question):
+    """Return the JSON representation of a question."""
+    return {
+        'id': question.pk,
+        'question_text': question.question_text,
+        'pub_date': question.pub_date,
+        'end_date': question.end_date,
+        'can_vote': question.can_vote(),
+    }
+
+
+def published(pk):
+    """
+    Return the published question `pk` with its snapshot and the version
+    of its results, or None.
+    """
+    return Question.objects.select_related('snapshot')\
+        .filter(pk=pk, pub_date__lte=timezone.localtime()).first()
+
+
+@require_GET
+def questions(request):
+    """List a page of the published questions, newest first."""
+    try:
+        index = published_questions(after=request.GET.get('after'),
+                                    before=request.GET.get('before'))
+    except InvalidCursor:
+        return error('Invalid page cursor.', 404)
+    return JsonResponse({
+        'questions': [question_data(q) for q in index.questions],
+        'previous': index.page.previous_cursor,
+        'next': index.page.next_cursor,
+    })
+
+
+@require_GET
+def question(request, pk):
+    """Return a published question with its choices."""
+    found = published(pk)
+    if found is None:
+        return error('Question does not exist.', 404)
+    data = question_data(found)
+    data['choices'] = [
+        {'id': choice_id, 'choice_text': text}
+        for choice_id, text in found.choice_set.order_by('pk')
+        .values_list('pk', 'choice_text')
+    ]
+    return JsonResponse(data)
+
+
+@require_GET
+def results(request, pk):
+    """Return the vote counts of every choice of a published question."""
+    found = published(pk)
+    if found is None:
+        return error('Question does not exist.', 404)
+    etag = make_etag('api-results', pk, found.results_version)
+    last_modified = version_time(found.results_version)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        counted = question_results(found)
+        response = JsonResponse({
+            'question': question_data(found),
+            'choices': [choice._asdict() for choice in counted.choices],
+            'total': counted.total,
+        })
+    return shared_results(response, found, etag, last_modified)
+
+
+@pin_to_primary
+@require_POST
+def vote(request, pk):
+    """Cast the vote of the logged in user for the posted choice."""
+    if not request.user.is_authenticated:
+        return error('Authentication required.', 401)
+    found = published(pk)
+    if found is None:
+        return error('Question does not exist.', 404)
+    if not found.can_vote():
+        return error('Voting on this question has ended.', 403)
+    try:
+        choice = found.choice_set.get(pk=request.POST['choice'])
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        return error("You didn't select a choice.", 400)
+    if settings.POLLS_VOTE_INGESTION == 'queue':
+        get_vote_queue().put(request.user.pk, found.pk, choice.pk)
+        VOTES.inc(outcome='queued')
+        return JsonResponse({'question': found.pk, 'choice': choice.pk},
+                            status=202)
+    outcome = cast_vote(request.user, choice)
+    VOTES.inc(outcome=outcome.kind)
+    return JsonResponse({
+        'question': found.pk,
+        'choice': choice.pk,
+        'created': outcome.created,
+        'changed': outcome.changed,
+    }, status=201 if outcome.created else 200)
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        """
+        Connect the signal receivers of the application, register the
+        checks of the site settings, and load the password validators,
+        with the list of common passwords, before the first signup needs
+        them.
+        """
+        from django.contrib.auth import password_validation
+        from mysite import checks  # noqa: F401
+
+        from . import signals  # noqa: F401
+        password_validation.get_default_password_validators()
@@ -0,0 +1,152 @@
+"""
+Async versions of the read-only pages of the application.
+
+They read the database through the async ORM API so that an ASGI server
+does not pin a worker thread while a query runs. polls.urls uses them
+instead of the views in polls.views when POLLS_ASYNC_VIEWS is on, which
+mysite.asgi turns on by default. Voting stays synchronous and runs in
+the thread that Django keeps for sync code.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.views import View
+from django.contrib import messages
+from mysite.metrics import TimedViewMixin
+
+from .cache import (apublished_questions, aquestion_bundle, aresults_version,
+                    auser_votes)
+from .http import (has_messages, make_etag, not_modified, private_page,
+                   shared_results)
+from .models import Question
+from .pagination import InvalidCursor
+from .rendering import question_items
+from .services import aquestion_results
+from .views import live_results, vote
+
+
+async def load_user(request):
+    """
+    Resolve request.user, and with it the session, in the sync thread so
+    that templates can use both without querying from the event loop.
+    """
+    def load():
+        return request.user if request.user.is_authenticated else None
+    return await sync_to_async(load)()
+
+
+class IndexView(TimedViewMixin, View):
+    """Index page of application."""
+
+    metrics_name = 'polls:index'
+
+    async def get(self, request):
+        """Return a page of the published questions."""
+        after = request.GET.get('after')
+        before = request.GET.get('before')
+        try:
+            index_cache = await apublished_questions(after=after,
+                                                     before=before)
+        except InvalidCursor:
+            raise Http404('Invalid page of polls.')
+        user = await load_user(request)
+        votes = await auser_votes(user.pk) if user else {}
+        return render(request, 'polls/index.html', {
+            'latest_question_list': index_cache.questions,
+            'index_cache': index_cache,
+            'page': index_cache.page,
+            'after': after or '',
+            'before': before or '',
+            'voted': tuple(sorted(q.pk for q in index_cache.questions
+                                  if q.pk in votes)),
+            'question_items': lambda: question_items(index_cache.questions,
+                                                     index_cache.active),
+        })
+
+
+class DetailView(TimedViewMixin, View):
+    """Detail page of application."""
+
+    metrics_name = 'polls:detail'
+
+    async def get(self, request, pk):
+        """Return different pages depend on is_published and can_vote.
+        Return index page if is_published or can_vote are true.
+        If not return detail page.
+        """
+        user = await load_user(request)
+        version = await aresults_version(pk)
+        question = await aquestion_bundle(pk)
+        if question is None:
+            messages.error(request, 'Question does not exist')
+            # redirect back to index page
+            return redirect('/')
+        if not question.is_published():
+            messages.error(request, 'This question is not published')
+            return HttpResponseRedirect(reverse('polls:index'))
+        if not question.can_vote():
+            messages.error(request, 'You cannot vote unpublished \
+                           or ended question')
+            return HttpResponseRedirect(reverse('polls:index'))
+        if user is None:
+            return redirect('login')
+        etag = None
+        if not has_messages(request):
+            etag = make_etag('detail', pk, version, user.pk,
+                             request.META.get('CSRF_COOKIE'))
+            response = not_modified(request, etag)
+            if response is not None:
+                return private_page(response, etag)
+        selected_choice = (await auser_votes(user.pk)).get(question.pk)
+        # prefetched with the cached question
+        choices = list(question.choice_set.all())
+        return private_page(render(request, 'polls/detail.html', {
+                'question': question,
+                'choices': choices,
+                'selected_choice': selected_choice
+            }), etag)
+
+
+class ResultsView(TimedViewMixin, View):
+    """Result page of application."""
+
+    metrics_name = 'polls:results'
+
+    async def get(self, request, pk):
+        """Return different pages depend on is_published.
+        Redirect index page if question does not exist or
+        is_published is false. Return result page"""
+        user = await load_user(request)
+        question = await Question.objects.select_related('snapshot')\
+            .filter(pk=pk).afirst()
+        if question is None:
+            messages.error(request, 'You cannot go to result \
+                           page of the question does not exist')
+            # redirect back to index page
+            return redirect('/')
+        if not question.is_published():
+            messages.error(request, 'You cannot watch the result \
+                           of unpublished or ended question')
+            return HttpResponseRedirect(reverse('polls:index'))
+        etag = None
+        if not has_messages(request):
+            etag = make_etag('results', pk, question.results_version,
+                             user is not None)
+            response = not_modified(request, etag)
+            if response is not None:
+                return shared_results(response, question, etag,
+                                      user_specific=True)
+        response = render(request, 'polls/results.html', {
+                'question': question,
+                'results': await aquestion_results(question),
+                'live': live_results(request),
+            })
+        if etag is None:
+            return private_page(response)
+        return shared_results(response, question, etag, user_specific=True)
+
+
+async def vote_view(request, question_id):
+    """Run the synchronous vote view in the thread kept for sync code."""
+    return await sync_to_async(vote)(request, question_id)
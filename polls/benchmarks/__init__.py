@@ -0,0 +1,83 @@
+"""
+Benchmarks of the polls application.
+
+Each module in this package has a `run(**options)` function that returns
+a JSON-serializable dict. They are run against a throwaway test database
+by `python manage.py benchmark <name>`, which can compare the results
+with those of an earlier run to flag regressions.
+"""
+import math
+import time
+
+BENCHMARKS = [
+    'endpoints',
+    'render',
+    'server',
+    'signup',
+    'vote_lookup',
+    'vote_throughput',
+]
+
+
+def percentile(ordered, fraction):
+    """Return the value at `fraction` of the sorted list `ordered`."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[max(0, index)]
+
+
+def summarize(samples):
+    """Return latency statistics in milliseconds of `samples` in seconds."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean_ms': 1000 * total / len(ordered) if ordered else 0.0,
+        'p50_ms': 1000 * percentile(ordered, 0.50),
+        'p90_ms': 1000 * percentile(ordered, 0.90),
+        'p99_ms': 1000 * percentile(ordered, 0.99),
+        'max_ms': 1000 * ordered[-1] if ordered else 0.0,
+    }
+
+
+def timed(function, *args, **kwargs):
+    """Call `function` and return its duration in seconds."""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+# metrics that get worse when they go up, and when they go down
+HIGHER_IS_WORSE = ('_ms', 'queries_per_request', 'max_queries', 'errors')
+LOWER_IS_WORSE = ('_per_second',)
+
+
+def compare(baseline, current, tolerance=0.1, path=''):
+    """
+    Return the regressions of `current` results from `baseline` results:
+    latencies, query counts or errors that grew, or throughputs that
+    dropped, by more than `tolerance` (a fraction). Query counts may not
+    grow at all.
+    """
+    regressions = []
+    for key, value in current.items():
+        name = f'{path}.{key}' if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            regressions += compare(old or {}, value, tolerance, name)
+            continue
+        if not isinstance(value, (int, float)) or \
+                not isinstance(old, (int, float)):
+            continue
+        if key.endswith(HIGHER_IS_WORSE):
+            allowed = old if 'queries' in key else old * (1 + tolerance)
+            worse = value > allowed
+        elif key.endswith(LOWER_IS_WORSE):
+            worse = value < old * (1 - tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append({'metric': name, 'baseline': old,
+                                'current': value})
+    return regressions
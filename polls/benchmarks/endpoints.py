@@ -0,0 +1,133 @@
+"""
+Measure the index, detail, results and vote endpoints.
+
+Every endpoint is first requested `repeat` times in a row through the
+Django test client, recording the latency and the number of queries of
+each request. Then `threads` clients, each logged in as its own user,
+request a random mix of the endpoints at the same time, which gives the
+throughput under concurrency. Run it twice and pass the first output to
+`manage.py benchmark endpoints --compare` to flag regressions.
+"""
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Choice
+
+from . import summarize
+from .seed import seed
+
+ENDPOINTS = ['index', 'detail', 'results', 'vote']
+
+
+def _requests(choices, rng):
+    """Yield (endpoint, method, path, data) of random requests."""
+    while True:
+        endpoint = rng.choice(ENDPOINTS)
+        question_id, choice_id = rng.choice(choices)
+        if endpoint == 'index':
+            yield endpoint, 'get', reverse('polls:index'), None
+        elif endpoint == 'vote':
+            yield endpoint, 'post', reverse('polls:vote',
+                                            args=(question_id,)), \
+                {'choice': choice_id}
+        else:
+            yield endpoint, 'get', reverse(f'polls:{endpoint}',
+                                           args=(question_id,)), None
+
+
+def _send(client, method, path, data):
+    response = getattr(client, method)(path, data)
+    assert response.status_code < 400, (path, response.status_code)
+    return response
+
+
+def run_sequential(client, choices, repeat):
+    """Request every endpoint `repeat` times, counting queries."""
+    results = {}
+    for endpoint in ENDPOINTS:
+        rng = random.Random(endpoint)
+        requests = (request for request in _requests(choices, rng)
+                    if request[0] == endpoint)
+        samples, queries = [], []
+        for _ in range(repeat):
+            _, method, path, data = next(requests)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                _send(client, method, path, data)
+                samples.append(time.perf_counter() - start)
+            queries.append(len(captured))
+        results[endpoint] = {
+            'latency': summarize(samples),
+            'queries_per_request': sum(queries) / len(queries),
+            'max_queries': max(queries),
+        }
+    return results
+
+
+def run_concurrent(users, choices, repeat, threads):
+    """Send `repeat` random requests from `threads` clients at once."""
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = []
+    start = threading.Barrier(threads)
+
+    def driver(number):
+        rng = random.Random(number)
+        client = Client()
+        client.force_login(users[number % len(users)])
+        requests = _requests(choices, rng)
+        try:
+            start.wait()
+            for _ in range(repeat // threads):
+                endpoint, method, path, data = next(requests)
+                began = time.perf_counter()
+                try:
+                    _send(client, method, path, data)
+                except Exception as error:
+                    errors.append(f'{type(error).__name__}: {error}')
+                    continue
+                samples[endpoint].append(time.perf_counter() - began)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=driver, args=(number,))
+               for number in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    served = sum(len(endpoint) for endpoint in samples.values())
+    return {
+        'threads': threads,
+        'requests': served,
+        'errors': len(errors),
+        'error_kinds': sorted(set(errors)),
+        'requests_per_second': served / elapsed if elapsed else 0.0,
+        'latency': {endpoint: summarize(endpoint_samples)
+                    for endpoint, endpoint_samples in samples.items()},
+    }
+
+
+def run(questions=200, choices=4, users=200, votes_per_user=20,
+        repeat=500, threads=8, **options):
+    """Seed the database and measure the endpoints."""
+    dataset = seed(questions=questions, choices=choices, users=users,
+                   votes_per_user=votes_per_user)
+    all_users = list(User.objects.filter(username__startswith='benchmark'))
+    all_choices = list(Choice.objects.values_list('question', 'pk'))
+    client = Client()
+    client.force_login(all_users[0])
+    return {
+        'dataset': dataset,
+        'sequential': run_sequential(client, all_choices, repeat),
+        'concurrent': run_concurrent(all_users, all_choices, repeat,
+                                     threads),
+    }
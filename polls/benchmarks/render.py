@@ -0,0 +1,74 @@
+"""
+Time the rendering of the list of every question.
+
+`url_tags` renders each item with the template of earlier versions,
+one render per question reversing two URLs with {% url %}. `links`
+renders the list at once with the links of polls.rendering. `page` is
+the whole streamed all page, queries included.
+"""
+from django.contrib.auth.models import AnonymousUser
+from django.template import engines
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.urls import reverse
+
+from polls.models import Question
+from polls.rendering import question_items
+from polls.scheduler import scheduler
+from polls.views import all_questions
+
+from . import summarize, timed
+from .seed import seed
+
+URL_TAGS_ITEM = '''<div class="question">
+    <h3>{{ number }}. {{question.question_text}}</h3>
+    {% if question.id in voted %}
+    <p class="voted">You voted</p>
+    {% endif %}
+    {% if question.id in active %}
+    <a href="{% url 'polls:detail' question.id %}"
+        style="text-decoration: none;
+               color: black;">
+        <button>Vote</button>
+    </a>
+    {% endif %}
+    <a href="{% url 'polls:results' question.id %}"
+        style="text-decoration: none;
+               color: black;">
+        <button>Results</button>
+    </a>
+</div>
+<br>
+'''
+
+
+def run(questions=10_000, repeat=5, **options):
+    """Seed `questions` questions and time rendering them all."""
+    dataset = seed(questions=questions, choices=0, users=0)
+    listed = list(Question.objects.order_by('-pub_date', '-pk'))
+    active = scheduler.active_questions()
+    legacy = engines['django'].from_string(URL_TAGS_ITEM)
+    question_list = get_template('polls/question_list.html')
+
+    def url_tags():
+        for number, question in enumerate(listed, start=1):
+            legacy.render({'question': question, 'number': number,
+                           'active': active, 'voted': ()})
+
+    def links():
+        question_list.render({'question_items': question_items(listed,
+                                                               active),
+                              'offset': 0, 'voted': ()})
+
+    request = RequestFactory().get(reverse('polls:all'))
+    request.user = AnonymousUser()
+
+    def page():
+        for _ in all_questions(request).streaming_content:
+            pass
+
+    results = {'dataset': dataset}
+    for name, function in (('url_tags', url_tags), ('links', links),
+                           ('page', page)):
+        results[name] = summarize([timed(function) for _ in range(repeat)])
+    return results
@@ -0,0 +1,62 @@
+"""Seed a database with a synthetic polls dataset for benchmarking."""
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+@transaction.atomic
+def seed(questions=100, choices=4, users=1000, votes_per_user=None,
+         batch_size=5000, seed=0):
+    """
+    Create `questions` published questions with `choices` choices each,
+    `users` users, and let every user vote on `votes_per_user` random
+    questions (all of them by default). Return the created row counts.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    Question.objects.bulk_create(
+        (Question(question_text=f'Benchmark question {i}',
+                  pub_date=now - datetime.timedelta(minutes=i))
+         for i in range(questions)),
+        batch_size=batch_size)
+    question_ids = list(Question.objects.values_list('pk', flat=True))
+    Choice.objects.bulk_create(
+        (Choice(question_id=question_id, choice_text=f'Choice {i}')
+         for question_id in question_ids for i in range(choices)),
+        batch_size=batch_size)
+    choice_ids = {}
+    for pk, question_id in Choice.objects.values_list('pk', 'question'):
+        choice_ids.setdefault(question_id, []).append(pk)
+    # '!' is an unusable password, hashing one per user would dominate
+    User.objects.bulk_create(
+        (User(username=f'benchmark{i}', password='!')
+         for i in range(users)),
+        batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith='benchmark')
+                    .values_list('pk', flat=True))
+    if votes_per_user is not None:
+        votes_per_user = min(votes_per_user, len(question_ids))
+
+    def votes():
+        for user_id in user_ids:
+            if votes_per_user is not None:
+                voted = rng.sample(question_ids, votes_per_user)
+            else:
+                voted = question_ids
+            for question_id in voted:
+                yield Vote(user_id=user_id, question_id=question_id,
+                           choice_id=rng.choice(choice_ids[question_id]))
+
+    Vote.objects.bulk_create(votes(), batch_size=batch_size)
+    Choice.objects.recount_votes()
+    return {
+        'questions': len(question_ids),
+        'choices': sum(len(ids) for ids in choice_ids.values()),
+        'users': len(user_ids),
+        'votes': Vote.objects.count(),
+    }
@@ -0,0 +1,126 @@
+"""
+Compare concurrent-request throughput of the WSGI and ASGI handlers.
+
+The WSGI handler serves the sync views from a pool of `threads` threads;
+the ASGI handler serves the async views (POLLS_ASYNC_VIEWS) with
+`threads` concurrent requests on one event loop. Requests are fed to the
+handlers in process, without sockets, so the numbers compare the
+handlers and views rather than an HTTP server.
+"""
+import asyncio
+import importlib
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import override_settings
+from django.urls import clear_url_caches, reverse
+
+from polls.models import Question
+
+from . import summarize
+from .seed import seed
+
+
+def _paths(questions, repeat):
+    """Return `repeat` random index and results page paths."""
+    rng = random.Random(0)
+    paths = []
+    for _ in range(repeat):
+        if rng.random() < 0.2:
+            paths.append(reverse('polls:index'))
+        else:
+            paths.append(reverse('polls:results',
+                                 args=(rng.choice(questions),)))
+    return paths
+
+
+def _reload_urls(async_views):
+    """Rebuild the URLconf with the sync or the async polls views."""
+    with override_settings(POLLS_ASYNC_VIEWS=async_views):
+        import mysite.urls
+        import polls.urls
+        importlib.reload(polls.urls)
+        importlib.reload(mysite.urls)
+    clear_url_caches()
+
+
+def run_wsgi(paths, threads):
+    """Serve `paths` through WSGIHandler from `threads` threads."""
+    handler = WSGIHandler()
+
+    def request(path):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+        }
+        start = time.perf_counter()
+        body = b''.join(handler(environ, lambda status, headers: None))
+        assert body
+        return time.perf_counter() - start
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        samples = list(pool.map(request, paths))
+    return samples, time.perf_counter() - began
+
+
+def run_asgi(paths, threads):
+    """Serve `paths` through ASGIHandler, `threads` at a time."""
+    handler = ASGIHandler()
+
+    async def request(path, slots):
+        async with slots:
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': path,
+                'query_string': b'', 'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'scheme': 'http',
+                'asgi': {'version': '3.0'},
+            }
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                sent.append(message)
+
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            return time.perf_counter() - start
+
+    async def main():
+        slots = asyncio.Semaphore(threads)
+        return await asyncio.gather(*(request(path, slots)
+                                      for path in paths))
+
+    began = time.perf_counter()
+    samples = asyncio.run(main())
+    return samples, time.perf_counter() - began
+
+
+def run(questions=200, choices=4, users=200, votes_per_user=20,
+        repeat=2000, threads=16, **options):
+    """Seed the database and serve the same requests both ways."""
+    dataset = seed(questions=questions, choices=choices, users=users,
+                   votes_per_user=votes_per_user)
+    paths = _paths(list(Question.objects.values_list('pk', flat=True)),
+                   repeat)
+    results = {'dataset': dataset, 'concurrency': threads}
+    for name, async_views, serve in (('wsgi', False, run_wsgi),
+                                     ('asgi', True, run_asgi)):
+        _reload_urls(async_views)
+        try:
+            samples, elapsed = serve(paths, threads)
+        finally:
+            _reload_urls(False)
+        results[name] = {
+            'requests_per_second': len(samples) / elapsed,
+            'latency': summarize(samples),
+        }
+    return results
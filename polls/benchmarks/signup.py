@@ -0,0 +1,70 @@
+"""
+Measure the CPU time of a signup.
+
+`authenticate` is the signup of earlier versions, which checked the new
+password once more after saving the user, `login` logs the saved user in
+directly. Both run the password validators and save the user as the
+signup form does. `request` is a whole signup through the test client.
+Each is measured with Django's PBKDF2 iterations and with `iterations`.
+"""
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.hashers import get_hasher
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import summarize
+
+
+def _data(name):
+    return {'username': name, 'password1': 'correct-horse-42',
+            'password2': 'correct-horse-42'}
+
+
+def _cpu(function, names):
+    """Call function(name) for each name, return its CPU times."""
+    samples = []
+    for name in names:
+        start = time.process_time()
+        function(name)
+        samples.append(time.process_time() - start)
+    return summarize(samples)
+
+
+def save(name):
+    form = UserCreationForm(_data(name))
+    assert form.is_valid(), form.errors
+    return form.save()
+
+
+def save_and_authenticate(name):
+    save(name)
+    assert authenticate(username=name, password='correct-horse-42')
+
+
+def run(repeat=20, iterations=100_000, **options):
+    """Time every signup pipeline with both iteration counts."""
+    client = Client()
+    url = reverse('signup')
+    results = {}
+    for label, count in (('default', 0), ('configured', iterations)):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=count,
+                               AUTH_RATE_LIMIT_BURST=0):
+
+            def request(name):
+                client.post(url, _data(name))
+                client.logout()
+
+            names = [f'{label}-{pipeline}-{number}'
+                     for pipeline in ('authenticate', 'login', 'request')
+                     for number in range(repeat)]
+            results[label] = {
+                'iterations': get_hasher().iterations,
+                'authenticate': _cpu(save_and_authenticate,
+                                     names[:repeat]),
+                'login': _cpu(save, names[repeat:2 * repeat]),
+                'request': _cpu(request, names[2 * repeat:]),
+            }
+    return results
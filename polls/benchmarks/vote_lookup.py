@@ -0,0 +1,36 @@
+"""
+Time the lookup of a user's vote for a question.
+
+`join` is the lookup through Choice used before Vote had its own
+question column, `column` is the lookup on the (user, question) unique
+index.
+"""
+import random
+
+from polls.models import Vote
+
+from . import summarize, timed
+from .seed import seed
+
+
+def run(questions=200, choices=4, users=2000, votes_per_user=50,
+        repeat=2000, **options):
+    """Seed the database and time both lookups on the same pairs."""
+    dataset = seed(questions=questions, choices=choices, users=users,
+                   votes_per_user=votes_per_user)
+    rng = random.Random(1)
+    pairs = list(Vote.objects.values_list('user', 'question'))
+    pairs = [rng.choice(pairs) for _ in range(repeat)]
+
+    def join(user_id, question_id):
+        Vote.objects.filter(user=user_id,
+                            choice__question=question_id).first()
+
+    def column(user_id, question_id):
+        Vote.objects.filter(user=user_id, question=question_id).first()
+
+    return {
+        'dataset': dataset,
+        'join': summarize([timed(join, *pair) for pair in pairs]),
+        'column': summarize([timed(column, *pair) for pair in pairs]),
+    }
@@ -0,0 +1,64 @@
+"""
+Measure how many votes per second concurrent threads can cast.
+
+Run it once with and once without DATABASE_PROFILE=production to compare
+the tuned SQLite profile with the default one. Failed votes, typically
+"database is locked", are counted rather than retried.
+"""
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import connections
+
+from polls.models import Choice
+from polls.services import cast_vote
+
+from . import summarize, timed
+from .seed import seed
+
+
+def run(questions=50, choices=4, users=500, repeat=4000, threads=8,
+        **options):
+    """Seed the database and cast `repeat` votes from `threads` threads."""
+    dataset = seed(questions=questions, choices=choices, users=users,
+                   votes_per_user=0)
+    all_users = list(User.objects.filter(username__startswith='benchmark'))
+    all_choices = list(Choice.objects.all())
+    samples, errors = [], []
+    start = threading.Barrier(threads)
+
+    def voter(number):
+        rng = random.Random(number)
+        try:
+            start.wait()
+            for _ in range(repeat // threads):
+                user = rng.choice(all_users)
+                choice = rng.choice(all_choices)
+                try:
+                    samples.append(timed(cast_vote, user, choice))
+                except Exception as error:
+                    errors.append(type(error).__name__ + ': ' + str(error))
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=voter, args=(number,))
+               for number in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    return {
+        'dataset': dataset,
+        'engine': connections['default'].settings_dict['ENGINE'],
+        'threads': threads,
+        'votes': len(samples),
+        'errors': len(errors),
+        'error_kinds': sorted(set(errors)),
+        'seconds': elapsed,
+        'votes_per_second': len(samples) / elapsed if elapsed else 0.0,
+        'latency': summarize(samples),
+    }
@@ -0,0 +1,298 @@
+"""This module contains the caching helpers of the application."""
+import copy
+import math
+import time
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Choice, Question, Vote
+from .pagination import KeysetPage, akeyset_page, keyset_page
+from .tiered import TieredCache, bounded_timeout
+
+INDEX_VERSION_KEY = 'polls:index:version'
+USER_VOTES_VERSION_KEY = 'polls:user:{}:votes:version'
+USER_VOTES_KEY = 'polls:user:{}:votes:{}'
+QUESTION_VERSION_KEY = 'polls:question:{}:version'
+
+# questions with their choices, see question_bundle()
+question_cache = TieredCache('polls:question',
+                             settings.POLLS_QUESTION_CACHE_SIZE,
+                             settings.POLLS_QUESTION_CACHE_TIMEOUT,
+                             settings.POLLS_QUESTION_LOCAL_TIMEOUT)
+
+
+class IndexCache(NamedTuple):
+    """A page of published questions and how to cache it."""
+
+    page: KeysetPage
+    version: int
+    timeout: int
+    # ids of the questions of the page open for voting
+    active: FrozenSet[int]
+
+    @property
+    def questions(self) -> List[Question]:
+        """Return the questions of the cached page."""
+        return self.page.questions
+
+
+def _version(key, timeout=None):
+    """Return the version stamp stored at `key`, making one if missing."""
+    version = cache.get(key)
+    if version is None:
+        # a lost stamp is replaced by a new one, never by an older one;
+        # add() so two processes starting at once agree on one stamp
+        version = time.time_ns()
+        if not cache.add(key, version, timeout):
+            version = cache.get(key, version)
+    return version
+
+
+async def _aversion(key, timeout=None):
+    """Async version of _version()."""
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout):
+            version = await cache.aget(key, version)
+    return version
+
+
+def _bump_on_commit(keys, timeout=None):
+    """
+    Give the `keys` new version stamps once the current transaction
+    commits, so that no reader sees a new stamp with the old data.
+    """
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            dict.fromkeys(keys, time.time_ns()), timeout))
+
+
+def index_version():
+    """Return the current version stamp of the published-question set."""
+    return _version(INDEX_VERSION_KEY)
+
+
+async def aindex_version():
+    """Async version of index_version()."""
+    return await _aversion(INDEX_VERSION_KEY)
+
+
+def invalidate_index():
+    """Forget every cached copy of the index page once committed."""
+    _bump_on_commit([INDEX_VERSION_KEY])
+
+
+def results_version(question_id):
+    """
+    Return the version of the results of a question, which changes
+    whenever one of its votes, choices or the question itself does. It is
+    read from the question row, where it changes in the same transaction,
+    so that every process sees the same version.
+    """
+    found = Question.objects.filter(pk=question_id)\
+        .values_list('results_version', flat=True).first()
+    return found or 0
+
+
+async def aresults_version(question_id):
+    """Async version of results_version()."""
+    found = await Question.objects.filter(pk=question_id)\
+        .values_list('results_version', flat=True).afirst()
+    return found or 0
+
+
+def invalidate_results(question_ids):
+    """Give the results of the questions a new version."""
+    Question.objects.filter(pk__in=question_ids).bump_results_version()
+
+
+def _bundle_query(question_id):
+    # the vote counts change with every vote, they are left out
+    choices = Choice.objects.only('pk', 'question', 'choice_text')\
+        .order_by('pk')
+    return Question.objects.filter(pk=question_id)\
+        .prefetch_related(Prefetch('choice_set', queryset=choices))
+
+
+def _copy_bundle(question):
+    """
+    Return a copy of a cached question with copies of its choices, so
+    that callers share nothing with the cached instances. deepcopy() would
+    drop the prefetched choices, querysets do not copy their results.
+    """
+    if question is None:
+        return None
+    copied = copy.copy(question)
+    copied._prefetched_objects_cache = {}
+    choices = []
+    for choice in question.choice_set.all():
+        choice = copy.copy(choice)
+        choice._state.fields_cache['question'] = copied
+        choices.append(choice)
+    prefetched = copied.choice_set.all()
+    prefetched._result_cache = choices
+    prefetched._prefetch_done = True
+    copied._prefetched_objects_cache = {
+        name: prefetched for name in question._prefetched_objects_cache}
+    return copied
+
+
+def question_bundle(question_id) -> Optional[Question]:
+    """
+    Return the question with its choices prefetched, or None if it does
+    not exist, from the per-process and shared caches until the question
+    or one of its choices changes (see polls.tiered for a cache backend
+    that is not shared).
+    """
+    version = _version(QUESTION_VERSION_KEY.format(question_id))
+    question = question_cache.get(
+        question_id, version, _bundle_query(question_id).first)
+    return _copy_bundle(question)
+
+
+async def aquestion_bundle(question_id) -> Optional[Question]:
+    """Async version of question_bundle()."""
+    version = await _aversion(QUESTION_VERSION_KEY.format(question_id))
+    question = await question_cache.aget(
+        question_id, version, _bundle_query(question_id).afirst)
+    return _copy_bundle(question)
+
+
+def invalidate_questions(question_ids):
+    """Give the cached questions a new version stamp on commit."""
+    _bump_on_commit([QUESTION_VERSION_KEY.format(pk)
+                     for pk in question_ids])
+
+
+def _user_votes_key(user_id, version):
+    return USER_VOTES_KEY.format(user_id, version)
+
+
+def _user_votes_query(user_id):
+    return Vote.objects.filter(user=user_id)\
+        .values_list('question', 'choice')
+
+
+def _user_votes_timeout():
+    return bounded_timeout(settings.POLLS_USER_VOTES_TIMEOUT,
+                           settings.POLLS_USER_VOTES_LOCAL_TIMEOUT)
+
+
+def user_votes(user_id) -> Dict[int, int]:
+    """
+    Return the votes of a user as {question_id: choice_id}, read in one
+    query and then kept in the cache until the user votes again. With a
+    cache of each process, which does not see the votes cast through the
+    others, they are kept POLLS_USER_VOTES_LOCAL_TIMEOUT seconds at most.
+    """
+    timeout = settings.POLLS_USER_VOTES_TIMEOUT
+    version = _version(USER_VOTES_VERSION_KEY.format(user_id), timeout)
+    key = _user_votes_key(user_id, version)
+    votes = cache.get(key)
+    if votes is None:
+        votes = dict(_user_votes_query(user_id))
+        cache.set(key, votes, _user_votes_timeout())
+    return votes
+
+
+async def auser_votes(user_id) -> Dict[int, int]:
+    """Async version of user_votes()."""
+    timeout = settings.POLLS_USER_VOTES_TIMEOUT
+    version = await _aversion(USER_VOTES_VERSION_KEY.format(user_id),
+                              timeout)
+    key = _user_votes_key(user_id, version)
+    votes = await cache.aget(key)
+    if votes is None:
+        votes = {question_id: choice_id async for question_id, choice_id
+                 in _user_votes_query(user_id)}
+        await cache.aset(key, votes, _user_votes_timeout())
+    return votes
+
+
+def invalidate_user_votes(user_ids):
+    """Make the cached votes of the users be read again after commit."""
+    _bump_on_commit([USER_VOTES_VERSION_KEY.format(pk) for pk in user_ids],
+                    settings.POLLS_USER_VOTES_TIMEOUT)
+
+
+def _schedule(now, questions):
+    """
+    Return when the next question gets published or closed, and which of
+    `questions` are open for voting until then.
+    """
+    from .scheduler import get_scheduler
+    scheduler = get_scheduler()
+    upcoming = scheduler.next_transition(now)
+    active = scheduler.active_questions(now) & {q.pk for q in questions}
+    return upcoming and upcoming.when, frozenset(active)
+
+
+def _timeout_until(next_transition, now):
+    """
+    Return how many seconds the index may be cached: until the next
+    question gets published or closed, but never longer than the
+    configured timeout, nor than the local one with a cache per process,
+    which the changes made by the other processes do not invalidate.
+    """
+    timeout = bounded_timeout(settings.POLLS_INDEX_CACHE_TIMEOUT,
+                              settings.POLLS_INDEX_LOCAL_TIMEOUT)
+    if next_transition is not None:
+        seconds = math.ceil((next_transition - now).total_seconds())
+        timeout = max(1, min(timeout, seconds))
+    return timeout
+
+
+def _index_key(version, after, before):
+    return f'polls:index:{version}:page:{after or ""}:{before or ""}'
+
+
+def _index_cache(cached, version):
+    page, expires, active = cached
+    # fragments rendered from this page must expire together with it
+    timeout = max(1, math.ceil(expires - time.time()))
+    return IndexCache(page, version, timeout, active)
+
+
+def published_questions(after=None, before=None) -> IndexCache:
+    """
+    Return a page of the published questions, newest first, from the
+    cache. `after` and `before` are the cursors of the neighbour pages.
+    """
+    version = index_version()
+    key = _index_key(version, after, before)
+    cached = cache.get(key)
+    if cached is None:
+        now = timezone.localtime()
+        page = keyset_page(Question.objects.filter(pub_date__lte=now),
+                           settings.POLLS_INDEX_PAGE_SIZE,
+                           after=after, before=before)
+        next_transition, active = _schedule(now, page.questions)
+        timeout = _timeout_until(next_transition, now)
+        cached = (page, time.time() + timeout, active)
+        cache.set(key, cached, timeout)
+    return _index_cache(cached, version)
+
+
+async def apublished_questions(after=None, before=None) -> IndexCache:
+    """Async version of published_questions()."""
+    version = await aindex_version()
+    key = _index_key(version, after, before)
+    cached = await cache.aget(key)
+    if cached is None:
+        now = timezone.localtime()
+        page = await akeyset_page(
+            Question.objects.filter(pub_date__lte=now),
+            settings.POLLS_INDEX_PAGE_SIZE, after=after, before=before)
+        next_transition, active = await sync_to_async(_schedule)(
+            now, page.questions)
+        timeout = _timeout_until(next_transition, now)
+        cached = (page, time.time() + timeout, active)
+        await cache.aset(key, cached, timeout)
+    return _index_cache(cached, version)
@@ -0,0 +1,121 @@
+"""
+In-process publisher of live vote counts.
+
+Once a vote commits, the current counters of its question are read and
+published, and each client streaming the results of that question holds
+a Subscription. Counters are read and pushed under one lock, the first
+counts of a new client included, so that every client receives them in
+the order they were read and never goes back to older counts. Pushing
+never blocks: the newest counts replace the pending ones and the event
+loop of the client is woken up, so a slow client receives the latest
+counts instead of a growing backlog.
+"""
+import asyncio
+import threading
+
+from django.db import router, transaction
+
+from .models import Choice
+
+
+class Subscription:
+    """Pending counts of one question for one client."""
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._counts = None
+
+    def _push(self, counts):
+        """Replace the pending counts, called with the publisher lock."""
+        self._counts = dict(counts)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # the loop of a disconnected client is already closed
+            pass
+
+    def _take(self):
+        """Return and forget the pending counts."""
+        self._ready.clear()
+        event, self._counts = {'counts': self._counts}, None
+        return event
+
+
+class VotePublisher:
+    """Fan out the vote counts of questions to their subscriptions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # held while counts are read and pushed, see the module docstring
+        self._read_lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, question_id):
+        """Return a new subscription, must be called in an event loop."""
+        subscription = Subscription(question_id)
+        with self._lock:
+            self._subscriptions.setdefault(question_id, set())\
+                .add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop sending counts to `subscription`."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.question_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.question_id]
+
+    def is_watched(self, question_id):
+        """Return whether any client is subscribed to the question."""
+        return question_id in self._subscriptions
+
+    def publish(self, question_id, counts):
+        """
+        Send the `counts` ({choice_id: votes}) of a question to its
+        subscriptions. Safe to call from any thread.
+        """
+        with self._lock:
+            for subscription in self._subscriptions.get(question_id, ()):
+                subscription._push(counts)
+
+    def publish_current(self, question_ids, subscription=None):
+        """
+        Read the counters of `question_ids` from the primary and send them
+        to their subscriptions, or only to `subscription`.
+        """
+        with self._read_lock:
+            counts = {question_id: {} for question_id in question_ids}
+            rows = Choice.objects.using(router.db_for_write(Choice))\
+                .filter(question__in=question_ids)\
+                .values_list('question', 'pk', 'vote_count')
+            for question_id, choice_id, votes in rows:
+                counts[question_id][choice_id] = votes
+            for question_id, choices in counts.items():
+                if subscription is None:
+                    self.publish(question_id, choices)
+                else:
+                    with self._lock:
+                        subscription._push(choices)
+
+    async def next_event(self, subscription, timeout):
+        """Wait for new counts, return None if there were none in time."""
+        try:
+            await asyncio.wait_for(subscription._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        with self._lock:
+            return subscription._take()
+
+
+publisher = VotePublisher()
+
+
+def publish_counts(question_ids):
+    """Send the counters of the watched questions once committed."""
+    watched = [pk for pk in question_ids if publisher.is_watched(pk)]
+    if watched:
+        transaction.on_commit(lambda: publisher.publish_current(watched))
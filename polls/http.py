@@ -0,0 +1,76 @@
+"""
+This module contains the HTTP caching policy of the pages.
+
+The pages of a question are validated with an ETag made from the version
+of its results (see polls.cache), so that a conditional request is
+answered with a 304 before any vote is counted. The results of an ended
+question only change when an admin edits it, which changes the version,
+so they may be cached for long; those of a live question only for a few
+seconds. Pages that depend on the logged in user are private and vary on
+the session cookie.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Return a strong ETag of the page built from `parts`."""
+    digest = hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def version_time(version):
+    """Return the time in seconds a version was made, None if unknown."""
+    return version // 1_000_000_000 or None
+
+
+def has_messages(request):
+    """Return whether the request has messages waiting to be shown."""
+    # len() loads the messages without marking them as shown
+    return len(messages.get_messages(request)) > 0
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Return a 304 response if the client already has the page with `etag`
+    or as of `last_modified` (in seconds), else None.
+    """
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=last_modified)
+
+
+def shared_results(response, question, etag, last_modified=None,
+                   user_specific=False):
+    """
+    Let browsers and proxies reuse the results of `question`: for long
+    once voting has ended, else briefly, serving them stale while they
+    revalidate.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if question.has_ended():
+        patch_cache_control(response, public=True,
+                            max_age=settings.POLLS_ENDED_RESULTS_MAX_AGE)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.POLLS_RESULTS_MAX_AGE,
+            stale_while_revalidate=(
+                settings.POLLS_RESULTS_STALE_WHILE_REVALIDATE))
+    if user_specific:
+        patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def private_page(response, etag=None):
+    """Keep a page of the logged in user out of shared caches."""
+    if etag is not None:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
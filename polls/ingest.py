@@ -0,0 +1,281 @@
+"""
+Write-behind ingestion of votes.
+
+When POLLS_VOTE_INGESTION is 'queue', the vote view only appends the vote
+to a VoteQueue and answers at once. A background thread coalesces the
+queued votes per (user, question), the last one winning, and writes each
+batch in one transaction. If POLLS_VOTE_QUEUE_DIR is set, every queued
+vote is first appended to a journal file there, so that votes not yet
+written when a process crashes can be replayed with
+`manage.py replay_votes`.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+
+from .cache import invalidate_user_votes
+from .events import publish_counts
+from .models import Choice, Question, Vote
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATTERN = 'votes-*.jsonl*'
+
+
+def coalesce(entries, pending=None):
+    """
+    Fold journal entries into a {(user_id, question_id): (time, choice_id)}
+    map, keeping the latest vote of each user for each question.
+    """
+    pending = {} if pending is None else pending
+    for entry in entries:
+        key = (entry['user'], entry['question'])
+        if key not in pending or pending[key][0] <= entry['time']:
+            pending[key] = (entry['time'], entry['choice'])
+    return pending
+
+
+def _valid_votes(pending):
+    """
+    Return the coalesced votes whose user and choice still exist, the
+    choice being one of their question, logging how many were dropped.
+    """
+    user_ids = {user_id for user_id, _ in pending}
+    choice_ids = {choice_id for _, choice_id in pending.values()}
+    users = set(User.objects.filter(pk__in=user_ids)
+                .values_list('pk', flat=True))
+    questions = dict(Choice.objects.filter(pk__in=choice_ids)
+                     .values_list('pk', 'question'))
+    valid = {(user_id, question_id): vote
+             for (user_id, question_id), vote in pending.items()
+             if user_id in users and questions.get(vote[1]) == question_id}
+    if len(valid) < len(pending):
+        logger.warning('Dropping %d queued votes whose user or choice no '
+                       'longer exists', len(pending) - len(valid))
+    return valid
+
+
+@transaction.atomic
+def apply_votes(pending):
+    """
+    Write coalesced votes in one transaction and move the counters of
+    their choices. Votes whose user or choice was deleted since they were
+    queued are dropped, so that they cannot fail the whole batch.
+    """
+    pending = _valid_votes(pending)
+    if not pending:
+        return 0
+    question_ids = {question_id for _, question_id in pending}
+    # lock the questions, whose rows every change of their counters locks
+    # first, so that a concurrent flush of another process reads the votes
+    # it replaces after this one wrote
+    list(Question.objects.select_for_update().filter(pk__in=question_ids)
+         .order_by('pk').values_list('pk', flat=True))
+    previous = {
+        (user_id, question_id): choice_id
+        for user_id, question_id, choice_id in Vote.objects.filter(
+            user__in={user_id for user_id, _ in pending},
+            question__in=question_ids)
+        .values_list('user', 'question', 'choice')
+        if (user_id, question_id) in pending}
+    deltas = defaultdict(int)
+    for key, (_, choice_id) in pending.items():
+        if previous.get(key) != choice_id:
+            deltas[choice_id] += 1
+            if key in previous:
+                deltas[previous[key]] -= 1
+    votes = [Vote(user_id=user_id, question_id=question_id,
+                  choice_id=choice_id)
+             for (user_id, question_id), (_, choice_id) in pending.items()]
+    Vote.objects.bulk_create(votes, batch_size=settings.POLLS_VOTE_FLUSH_SIZE,
+                             update_conflicts=True,
+                             unique_fields=['user', 'question'],
+                             update_fields=['choice'])
+    # bulk writes send no signals, so move the counters here, one UPDATE
+    # for the choices with the same change
+    by_delta = defaultdict(list)
+    for choice_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(choice_id)
+    for delta, choice_ids in by_delta.items():
+        Choice.objects.filter(pk__in=choice_ids).add_votes(delta)
+    publish_counts(question_ids)
+    invalidate_user_votes({user_id for user_id, _ in pending})
+    return len(votes)
+
+
+def read_journal(path):
+    """Yield the entries of a journal file, skipping a torn last line."""
+    with open(path) as journal:
+        for line in journal:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning('Skipping unreadable line in %s', path)
+
+
+class VoteQueue:
+    """Votes waiting to be written, with an optional journal file."""
+
+    def __init__(self, directory=None, flush_size=500, flush_interval=1.0):
+        self.directory = directory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        # rotated journals whose votes are not known to be written yet
+        self._unwritten = []
+        self._thread = None
+        self._stopping = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # a new process may get the pid of a crashed one, whose
+            # journal must be left for replay_votes
+            self._journal_path = os.path.join(
+                directory, f'votes-{os.getpid()}-{time.time_ns()}.jsonl')
+            self._journal = open(self._journal_path, 'a')
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, user_id, question_id, choice_id):
+        """Queue a vote, replacing a queued vote for the same question."""
+        entry = {'time': time.time(), 'user': user_id,
+                 'question': question_id, 'choice': choice_id}
+        with self._condition:
+            if self._journal is not None:
+                self._journal.write(json.dumps(entry) + '\n')
+                self._journal.flush()
+            coalesce([entry], self._pending)
+            if len(self._pending) >= self.flush_size:
+                self._condition.notify()
+
+    def flush(self):
+        """Write every queued vote and return how many rows were written."""
+        with self._flush_lock:
+            with self._condition:
+                pending, self._pending = self._pending, {}
+                flushing = self._rotate_journal()
+                if flushing:
+                    self._unwritten.append(flushing)
+            try:
+                written = apply_votes(pending)
+            except Exception:
+                # keep the votes and their journal for the next attempt
+                logger.exception('Could not write %d queued votes',
+                                 len(pending))
+                with self._condition:
+                    self._pending = coalesce(
+                        ({'time': t, 'user': u, 'question': q, 'choice': c}
+                         for (u, q), (t, c) in pending.items()),
+                        self._pending)
+                raise
+            for path in self._unwritten:
+                os.remove(path)
+            self._unwritten = []
+            return written
+
+    def _rotate_journal(self):
+        """Move the journal aside while its votes are being written."""
+        if self._journal is None:
+            return None
+        self._journal.close()
+        flushing = f'{self._journal_path}.{time.time_ns()}.flushing'
+        os.replace(self._journal_path, flushing)
+        self._journal = open(self._journal_path, 'a')
+        return flushing
+
+    def start(self):
+        """Start the background thread that flushes the queue."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='vote-queue-flusher')
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self._flush_until_stopped()
+        finally:
+            connections.close_all()
+
+    def _flush_until_stopped(self):
+        while True:
+            with self._condition:
+                if not self._stopping and \
+                        len(self._pending) < self.flush_size:
+                    self._condition.wait(self.flush_interval)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.flush_interval)
+            if stopping:
+                return
+
+    def drain(self):
+        """Stop the background thread and write what is still queued."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            if os.path.getsize(self._journal_path) == 0:
+                os.remove(self._journal_path)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_vote_queue():
+    """Return the vote queue of this process, starting it if needed."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = VoteQueue(settings.POLLS_VOTE_QUEUE_DIR,
+                               settings.POLLS_VOTE_FLUSH_SIZE,
+                               settings.POLLS_VOTE_FLUSH_INTERVAL)
+            _queue.start()
+        return _queue
+
+
+@atexit.register
+def drain_vote_queue():
+    """Write the queued votes of this process before it exits."""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None:
+        queue.drain()
+
+
+def replay_journals(directory):
+    """
+    Write the votes left in the journal files of `directory` by crashed
+    processes and delete the files. Return the number of rows written.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, JOURNAL_PATTERN)))
+    pending = {}
+    for path in paths:
+        coalesce(read_journal(path), pending)
+    written = apply_votes(pending)
+    for path in paths:
+        os.remove(path)
+    return written
@@ -0,0 +1,67 @@
+"""Run a benchmark of polls.benchmarks against a throwaway database."""
+import importlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from polls.benchmarks import BENCHMARKS, compare as compare_results
+
+
+class Command(BaseCommand):
+    help = ('Run a benchmark against a freshly created test database and '
+            'print its results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=BENCHMARKS)
+        parser.add_argument('--questions', type=int)
+        parser.add_argument('--choices', type=int)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--votes-per-user', type=int)
+        parser.add_argument('--repeat', type=int,
+                            help='Number of timed operations.')
+        parser.add_argument('--threads', type=int,
+                            help='Number of concurrent threads.')
+        parser.add_argument(
+            '--test-db-name',
+            help='Name of the throwaway database, by default the test '
+                 'database of the settings.')
+        parser.add_argument('--output',
+                            help='Also write the results to this file.')
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='Results of an earlier run to compare with; fail if a '
+                 'metric got worse.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.1,
+            help='Fraction by which timings may get worse before they '
+                 'count as a regression (default 0.1).')
+
+    def handle(self, *args, name, test_db_name=None, output=None,
+               compare=None, tolerance=0.1, **options):
+        benchmark = importlib.import_module(f'polls.benchmarks.{name}')
+        keys = ('questions', 'choices', 'users', 'votes_per_user', 'repeat',
+                'threads')
+        arguments = {key: options[key] for key in keys
+                     if options.get(key) is not None}
+        if test_db_name:
+            connection.settings_dict['TEST']['NAME'] = test_db_name
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {'benchmark': name, **benchmark.run(**arguments)}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if compare:
+            with open(compare) as file:
+                baseline = json.load(file)
+            results['regressions'] = compare_results(baseline, results,
+                                                     tolerance)
+        text = json.dumps(results, indent=2)
+        if output:
+            with open(output, 'w') as file:
+                file.write(text + '\n')
+        self.stdout.write(text)
+        if results.get('regressions'):
+            raise CommandError(f'{len(results["regressions"])} metric(s) '
+                               f'regressed from {compare}.')
@@ -0,0 +1,47 @@
+"""Stream users, questions, choices and votes out of the database."""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from polls.transfer import MODELS, export_csv, export_jsonl
+
+
+class Command(BaseCommand):
+    help = ('Export users (with their password hashes), questions, choices '
+            'and votes as JSON Lines, or as a directory of CSV files, '
+            'reading them in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='JSON Lines file ("-" for standard output), or directory '
+                 'of the CSV files.')
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            default='jsonl')
+        parser.add_argument(
+            '--model', action='append', dest='models', choices=MODELS,
+            help='Only export this model (can be repeated).')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows read per database round trip (default 2000).')
+
+    def handle(self, *args, output, format='jsonl', models=None,
+               chunk_size=2000, **options):
+        labels = [label for label in MODELS if label in (models or MODELS)]
+        verbosity = options['verbosity']
+
+        def progress(counts):
+            # keep standard output for the records
+            if verbosity >= 1:
+                self.stderr.write(', '.join(
+                    f'{label} {count}' for label, count in counts.items()))
+
+        if format == 'csv':
+            counts = export_csv(output, labels, chunk_size, progress)
+        elif output == '-':
+            counts = export_jsonl(sys.stdout, labels, chunk_size, progress)
+        else:
+            with open(output, 'w', encoding='utf-8') as stream:
+                counts = export_jsonl(stream, labels, chunk_size, progress)
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {sum(counts.values())} record(s).'))
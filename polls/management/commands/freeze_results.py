@@ -0,0 +1,29 @@
+"""Store the final results of ended questions as result snapshots."""
+from django.core.management.base import BaseCommand
+
+from polls.models import Question
+from polls.services import freeze_results
+
+
+class Command(BaseCommand):
+    help = ('Store the final vote counts of every ended question without a '
+            'snapshot, so that its results are served without counting '
+            'votes. Run it after polls close, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--question', type=int, action='append', dest='questions',
+            help='Limit to the given question id (can be repeated).',
+        )
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Count again the questions that already have a snapshot.',
+        )
+
+    def handle(self, *args, questions=None, refresh=False, **options):
+        queryset = Question.objects.all()
+        if questions:
+            queryset = queryset.filter(pk__in=questions)
+        frozen = freeze_results(queryset, refresh=refresh)
+        self.stdout.write(self.style.SUCCESS(
+            f'Froze the results of {frozen} question(s).'))
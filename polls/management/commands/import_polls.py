@@ -0,0 +1,49 @@
+"""Stream users, questions, choices and votes into the database."""
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.transfer import import_records, sources_of
+
+
+class Command(BaseCommand):
+    help = ('Import users, questions, choices and votes from JSON Lines '
+            'files, directories of CSV files or JSON fixtures, streaming '
+            'them in batches. Run it again with the same --state file to '
+            'resume an interrupted import.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', metavar='path')
+        parser.add_argument(
+            '--format', choices=['json', 'jsonl', 'csv'],
+            help='Format of the files, by default told by their extension.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Records written per transaction (default 5000).')
+        parser.add_argument(
+            '--state',
+            help='File recording how far every input got, to resume from.')
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Drop the secondary indexes during the import and build '
+                 'them at the end.')
+
+    def handle(self, *args, paths, format=None, batch_size=5000, state=None,
+               defer_indexes=False, **options):
+        verbosity = options['verbosity']
+
+        def progress(counts):
+            if verbosity >= 1:
+                self.stdout.write(', '.join(
+                    f'{label} {count}' for label, count in counts.items()))
+
+        try:
+            sources = [source for path in paths
+                       for source in sources_of(path, format)]
+            counts = import_records(sources, batch_size=batch_size,
+                                    state_path=state, progress=progress,
+                                    defer_indexes=defer_indexes)
+        except (ValueError, ValidationError) as error:
+            # TransferError, unreadable JSON or values of the wrong type
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {sum(counts.values())} record(s).'))
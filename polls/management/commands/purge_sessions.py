@@ -0,0 +1,57 @@
+"""Delete expired sessions in small batches, once or continuously."""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = ('Delete expired sessions in batches, so that logins are never '
+            'blocked for long, once or every --interval seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Sessions deleted per transaction (default 1000).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Seconds to wait between batches (default 0.1).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Purge again every INTERVAL seconds instead of once.',
+        )
+
+    def handle(self, *args, batch_size=1000, pause=0.1, interval=0,
+               **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        if not issubclass(engine.SessionStore, SessionStore):
+            self.stdout.write(f'Sessions of {settings.SESSION_ENGINE} '
+                              'expire by themselves.')
+            return
+        model = engine.SessionStore.get_model_class()
+        while True:
+            deleted = self.purge(model, batch_size, pause)
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} expired session(s).'))
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def purge(self, model, batch_size, pause):
+        deleted = 0
+        while True:
+            keys = list(model.objects
+                        .filter(expire_date__lt=timezone.now())
+                        .values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys)\
+                .delete()[0]
+            if len(keys) < batch_size:
+                return deleted
+            time.sleep(pause)
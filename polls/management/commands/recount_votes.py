@@ -0,0 +1,42 @@
+"""Rebuild or verify the per-choice vote counters from Vote rows."""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from polls.models import Choice
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Choice.vote_count from Vote rows, or verify it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report choices whose counter is wrong, '
+                 'and fail if there are any.',
+        )
+        parser.add_argument(
+            '--question', type=int, action='append', dest='questions',
+            help='Limit to the given question id (can be repeated).',
+        )
+
+    def handle(self, *args, check=False, questions=None, **options):
+        choices = Choice.objects.all()
+        if questions:
+            choices = choices.filter(question__in=questions)
+        if check:
+            wrong = choices.with_actual_votes()\
+                .exclude(vote_count=F('actual_votes'))\
+                .values_list('pk', 'vote_count', 'actual_votes')
+            for pk, stored, actual in wrong:
+                self.stdout.write(
+                    f'Choice {pk}: counter {stored}, actual {actual}')
+            if wrong:
+                raise CommandError(f'{len(wrong)} choice counter(s) are '
+                                   'out of date.')
+            self.stdout.write(self.style.SUCCESS('All counters are correct.'))
+            return
+        with transaction.atomic():
+            updated = choices.recount_votes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted votes of {updated} choice(s).'))
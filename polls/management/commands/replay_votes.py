@@ -0,0 +1,24 @@
+"""Write the votes left in the vote queue journals after a crash."""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.ingest import replay_journals
+
+
+class Command(BaseCommand):
+    help = ('Write the votes left in the journals of the vote queue by '
+            'processes that stopped without draining it. Run it while the '
+            'site is stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory', default=settings.POLLS_VOTE_QUEUE_DIR,
+            help='Journal directory, POLLS_VOTE_QUEUE_DIR by default.')
+
+    def handle(self, *args, directory=None, **options):
+        if not directory:
+            raise CommandError('No journal directory: set '
+                               'POLLS_VOTE_QUEUE_DIR or pass --directory.')
+        written = replay_journals(directory)
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {written} vote(s).'))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_votes(apps, schema_editor):
+    """Fill the new counters from the votes that are already stored."""
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    db_alias = schema_editor.connection.alias
+    counted = Vote.objects.using(db_alias).filter(choice=OuterRef('pk'))\
+        .order_by().values('choice')\
+        .annotate(total=Count('pk')).values('total')
+    Choice.objects.using(db_alias)\
+        .update(vote_count=Coalesce(Subquery(counted), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_remove_choice_votes_alter_question_pub_date_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_votes,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:02
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_question(apps, schema_editor):
+    """
+    Copy the question of each vote's choice onto the vote and keep only
+    the latest vote of a user for a question.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    db_alias = schema_editor.connection.alias
+    question = Choice.objects.using(db_alias)\
+        .filter(pk=OuterRef('choice')).values('question')
+    Vote.objects.using(db_alias).update(question=Subquery(question))
+
+    duplicated = Vote.objects.using(db_alias).values('user', 'question')\
+        .annotate(rows=Count('pk'), latest=Max('pk'))\
+        .filter(rows__gt=1)
+    for row in duplicated.iterator():
+        Vote.objects.using(db_alias)\
+            .filter(user=row['user'], question=row['question'])\
+            .exclude(pk=row['latest']).delete()
+
+    # historical models send no signals, so recount what was deleted
+    counted = Vote.objects.using(db_alias).filter(choice=OuterRef('pk'))\
+        .order_by().values('choice')\
+        .annotate(total=Count('pk')).values('total')
+    Choice.objects.using(db_alias)\
+        .update(vote_count=Coalesce(Subquery(counted), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_question_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.RunPython(backfill_question, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polls', '0012_vote_question'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'choice'], name='polls_vote_question_choice_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='polls_vote_one_per_question'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_vote_one_per_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='polls.question')),
+                ('end_date', models.DateTimeField()),
+                ('choices', models.JSONField()),
+                ('total', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
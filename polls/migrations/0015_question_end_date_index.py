@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_resultsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['end_date'], name='polls_question_end_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0015_question_end_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
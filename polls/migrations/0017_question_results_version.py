@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0016_choice_version'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='choice',
+            name='version',
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='results_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
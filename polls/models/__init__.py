@@ -1,3 +1,4 @@
 from .question import Question
 from .choice import Choice
 from .vote import Vote
+from .snapshot import ResultSnapshot
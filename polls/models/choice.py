@@ -1,20 +1,51 @@
 """This module contains Choice model."""
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from .question import Question
 
 
+class ChoiceQuerySet(models.QuerySet):
+    """QuerySet helpers for keeping the vote counters in step."""
+
+    def _bump_questions(self):
+        # the question row is locked before the choices, like a flush does
+        Question.objects.filter(pk__in=self.values('question'))\
+            .bump_results_version()
+
+    def add_votes(self, amount):
+        """Atomically add `amount` (may be negative) to the vote counters."""
+        self._bump_questions()
+        return self.update(vote_count=F('vote_count') + amount)
+
+    def with_actual_votes(self):
+        """Annotate each choice with its vote count taken from Vote rows."""
+        return self.annotate(actual_votes=Count('vote'))
+
+    def recount_votes(self):
+        """Rebuild the vote counters from Vote rows in a single UPDATE."""
+        from .vote import Vote
+        counted = Vote.objects.filter(choice=OuterRef('pk'))\
+            .order_by().values('choice')\
+            .annotate(total=Count('pk')).values('total')
+        self._bump_questions()
+        return self.update(vote_count=Coalesce(Subquery(counted), 0))
+
+
 class Choice(models.Model):
     """Model for Choice that has relevant with Question"""
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
-    # votes = models.IntegerField(default=0)
+    # denormalized number of Vote rows, kept in step by polls.signals
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ChoiceQuerySet.as_manager()
 
     @property
     def votes(self):
-        """Count the votes for this choice"""
-        # count = Vote.objects.filter(choice=self).count()
-        return self.vote_set.count()
+        """Return the number of votes for this choice."""
+        return self.vote_count
 
     def __str__(self):
         """Return readable string of each choice."""
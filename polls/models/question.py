@@ -1,17 +1,59 @@
 """This module contains Question model."""
 import datetime
+import time
 
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.contrib import admin
 
 
+class QuestionQuerySet(models.QuerySet):
+    """QuerySet helpers for the version of the results."""
+
+    def bump_results_version(self):
+        """
+        Give the results of the questions a new version: the current time
+        in nanoseconds, but always above the version they had. The rows
+        stay locked until the transaction ends, so a later commit always
+        leaves a higher version, whatever the clocks of the processes say.
+        """
+        return self.update(results_version=Greatest(
+            F('results_version') + 1, Value(time.time_ns())))
+
+
 class Question(models.Model):
     """Model for Question with publish date."""
 
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published')
     end_date = models.DateTimeField(null=True, blank=True)
+    # changed in the transaction of every change of the votes, the choices
+    # or the question itself (see polls.cache.results_version); only
+    # bump_results_version() writes it
+    results_version = models.BigIntegerField(default=0, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the index page seeks on (pub_date, id)
+            models.Index(fields=['pub_date', 'id'],
+                         name='polls_question_pub_id_idx'),
+            # the admin filters on end_date and the scheduler seeks on it
+            models.Index(fields=['end_date'],
+                         name='polls_question_end_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save the question without writing back an older version."""
+        if not self._state.adding and not kwargs.get('update_fields') \
+                and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'results_version']
+        super().save(*args, **kwargs)
 
     @admin.display(
         boolean=True,
@@ -38,3 +80,8 @@ class Question(models.Model):
         if self.end_date is None:
             return now >= self.pub_date
         return self.pub_date <= now <= self.end_date
+
+    def has_ended(self):
+        """Return boolean when voting is over and results are final."""
+        now = timezone.localtime()
+        return self.end_date is not None and self.end_date < now
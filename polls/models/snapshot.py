@@ -0,0 +1,26 @@
+"""This module contains ResultSnapshot model."""
+from django.db import models
+from .question import Question
+
+
+class ResultSnapshot(models.Model):
+    """Final vote counts of a question, frozen once voting has ended."""
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE,
+                                    primary_key=True,
+                                    related_name='snapshot')
+    # end_date of the question when frozen; the snapshot is only valid
+    # while the question still ends then
+    end_date = models.DateTimeField()
+    # [[choice id, choice text, votes], ...] in choice id order
+    choices = models.JSONField()
+    total = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def is_valid_for(self, question):
+        """Return whether the snapshot still matches `question`."""
+        return self.end_date == question.end_date
+
+    def __str__(self):
+        """Return readable string of each snapshot."""
+        return f'Results of {self.question_id} ({self.total} votes)'
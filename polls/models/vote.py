@@ -2,14 +2,40 @@
 from django.db import models
 from django.contrib.auth.models import User
 from .choice import Choice
+from .question import Question
 
 
 class Vote(models.Model):
     """Record a Vote of a Choice by a User."""
+    # denormalized from choice.question so that the vote of a user for a
+    # question is found without a join and can be unique
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
-    @property
-    def question(self):
-        """Question of that choice"""
-        return self.choice.question
+    # choice_id as last read from or written to the database, used by
+    # polls.signals to move the counter when a vote is switched.
+    _stored_choice_id = None
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='polls_vote_one_per_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'choice'],
+                         name='polls_vote_question_choice_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember which choice the loaded row points at."""
+        instance = super().from_db(db, field_names, values)
+        instance._stored_choice_id = instance.choice_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Keep the question in step with the selected choice."""
+        if self.choice_id is not None:
+            self.question_id = self.choice.question_id
+        super().save(*args, **kwargs)
@@ -0,0 +1,119 @@
+"""This module contains the keyset pagination of the question index."""
+import base64
+import binascii
+import datetime
+from typing import List, NamedTuple, Optional
+
+from django.db.models import Q
+
+from .models import Question
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class KeysetPage(NamedTuple):
+    """One page of questions, newest first, with its neighbour cursors."""
+
+    questions: List[Question]
+    previous_cursor: Optional[str]
+    next_cursor: Optional[str]
+    # number of questions newer than the first one of the page
+    offset: int = 0
+
+
+def encode_cursor(question: Question) -> str:
+    """Return an opaque cursor pointing at `question`."""
+    raw = f'{question.pub_date.isoformat()}|{question.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Return the (pub_date, id) pair stored in `cursor`."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+class KeysetQuery(NamedTuple):
+    """The query of one page and how to turn its rows into the page."""
+
+    queryset: object
+    size: int
+    after: Optional[str]
+    before: Optional[str]
+
+    def page(self, rows) -> KeysetPage:
+        """Return the page made of the fetched `rows`."""
+        has_more = len(rows) > self.size
+        if self.before is not None:
+            questions = rows[:self.size][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            questions = rows[:self.size]
+            has_previous, has_next = self.after is not None, has_more
+        if not questions:
+            return KeysetPage([], None, None)
+        return KeysetPage(
+            questions,
+            encode_cursor(questions[0]) if has_previous else None,
+            encode_cursor(questions[-1]) if has_next else None,
+        )
+
+
+def keyset_query(queryset, size, after=None, before=None) -> KeysetQuery:
+    """
+    Return the query of the page of `queryset` after (older than) or
+    before (newer than) the given cursor, ordered by (pub_date, id)
+    descending. Filtering on the key instead of using OFFSET lets the
+    database seek straight to the page through the (pub_date, id) index.
+    One extra row is fetched to know whether there is a further page.
+    """
+    if before is not None:
+        pub_date, pk = decode_cursor(before)
+        queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk))\
+            .order_by('pub_date', 'pk')
+    else:
+        if after is not None:
+            pub_date, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        queryset = queryset.order_by('-pub_date', '-pk')
+    return KeysetQuery(queryset[:size + 1], size, after, before)
+
+
+def newer_questions(queryset, page: KeysetPage):
+    """
+    Return the questions of `queryset` newer than the first one of `page`,
+    counted for its offset. The count walks the (pub_date, id) index up to
+    the page, so it is only made for the pages after the first.
+    """
+    first = page.questions[0]
+    return queryset.filter(Q(pub_date__gt=first.pub_date)
+                           | Q(pub_date=first.pub_date, pk__gt=first.pk))
+
+
+def keyset_page(queryset, size, after=None, before=None) -> KeysetPage:
+    """Return the page of `queryset` described in keyset_query()."""
+    query = keyset_query(queryset, size, after=after, before=before)
+    page = query.page(list(query.queryset))
+    if page.previous_cursor is None:
+        return page
+    return page._replace(offset=newer_questions(queryset, page).count())
+
+
+async def akeyset_page(queryset, size, after=None,
+                       before=None) -> KeysetPage:
+    """Async version of keyset_page()."""
+    query = keyset_query(queryset, size, after=after, before=before)
+    page = query.page([question async for question in query.queryset])
+    if page.previous_cursor is None:
+        return page
+    return page._replace(
+        offset=await newer_questions(queryset, page).acount())
@@ -0,0 +1,65 @@
+"""
+Rendering of the question lists of the index and of the all page.
+
+Both render one item per question. The links of an item only depend
+on the id of the question and on whether it is open for voting, so the
+links template is rendered once per list for each of the two cases,
+around a placeholder id, and the id of each question is filled in. The
+URLs are reversed once per pattern the same way. Nothing is cached, so
+that long lists never crowd other values out of the cache.
+"""
+from typing import Dict, List, Tuple
+
+from django.template.loader import get_template
+from django.urls import get_script_prefix, reverse
+from django.utils.safestring import SafeString, mark_safe
+
+from .models import Question
+
+# matches <int:...> and never appears elsewhere in a URL
+_PLACEHOLDER = 2147483647
+
+
+class UrlPattern:
+    """The URLs of a named pattern taking a question id."""
+
+    def __init__(self, name):
+        self.name = name
+        self._parts = {}
+
+    def __call__(self, question_id):
+        prefix = get_script_prefix()
+        parts = self._parts.get(prefix)
+        if parts is None:
+            url = reverse(self.name, args=(_PLACEHOLDER,))
+            parts = self._parts[prefix] = url.split(str(_PLACEHOLDER), 1)
+        return f'{parts[0]}{question_id}{parts[1]}'
+
+
+detail_url = UrlPattern('polls:detail')
+results_url = UrlPattern('polls:results')
+
+
+def question_links(questions, active) -> Dict[int, SafeString]:
+    """
+    Return the rendered links of `questions` by id, with a vote link for
+    the questions in `active`.
+    """
+    template = get_template('polls/question_links.html')
+    parts = {
+        flag: template.render({
+            'active': flag,
+            'detail_url': detail_url(_PLACEHOLDER),
+            'results_url': results_url(_PLACEHOLDER),
+        }).split(str(_PLACEHOLDER))
+        for flag in (False, True)
+    }
+    return {question.pk: mark_safe(str(question.pk)
+                                   .join(parts[question.pk in active]))
+            for question in questions}
+
+
+def question_items(questions, active) -> List[Tuple[Question, SafeString]]:
+    """Return the (question, links) pairs of the items of a list."""
+    links = question_links(questions, active)
+    return [(question, links[question.pk]) for question in questions]
@@ -0,0 +1,209 @@
+"""
+Publish and close transitions of the questions.
+
+QuestionScheduler keeps the coming pub_date and end_date of every
+question in a min-heap, so that the time of the next transition is known
+without a query, and runs hooks when a transition is due: the index is
+invalidated when a question gets published, and the results of a
+question are frozen (see polls.services.freeze_results) when it closes.
+The set of questions open for voting only changes at transitions, so it
+is kept until the next one.
+
+The heap is loaded on first use. Saving or deleting a question bumps the
+index stamp once committed (see polls.signals), and the scheduler
+reloads when it sees a new stamp. Only the processes sharing the cache
+see that stamp, so the heap is also reloaded every
+POLLS_SCHEDULER_INTERVAL seconds: with a per process cache such as the
+default LocMemCache, a question changed by another process is picked up
+that late at most. Due transitions are run by the next call that looks
+at the schedule, or at the exact moment by a background thread when
+POLLS_SCHEDULER_THREAD is on.
+"""
+import datetime
+import heapq
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import index_version, invalidate_index, invalidate_results
+from .models import Question
+from .services import freeze_results
+
+logger = logging.getLogger(__name__)
+
+PUBLISH = 'publish'
+CLOSE = 'close'
+
+
+class Transition(NamedTuple):
+    """A question getting published or closed at a given time."""
+
+    when: datetime.datetime
+    question_id: int
+    kind: str
+
+
+class QuestionScheduler:
+    """The coming transitions of the questions, soonest first."""
+
+    def __init__(self):
+        self._heap = []
+        self._version = None
+        # time.monotonic() of the last load
+        self._loaded_at = None
+        self._synced_at = None
+        self._active = None
+        self._hooks = {PUBLISH: [], CLOSE: []}
+        self._condition = threading.Condition(threading.RLock())
+        self._thread = None
+        self._stopping = False
+
+    def on(self, kind, hook):
+        """Call hook(transition) whenever a transition of `kind` is due."""
+        self._hooks[kind].append(hook)
+        return hook
+
+    def _load(self, since):
+        """Read the transitions later than `since` into the heap."""
+        rows = Question.objects\
+            .filter(Q(pub_date__gt=since) | Q(end_date__gt=since))\
+            .values_list('pk', 'pub_date', 'end_date')
+        heap = []
+        for pk, pub_date, end_date in rows:
+            if pub_date > since:
+                heap.append(Transition(pub_date, pk, PUBLISH))
+            if end_date is not None and end_date > since:
+                heap.append(Transition(end_date, pk, CLOSE))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._active = None
+        self._loaded_at = time.monotonic()
+
+    def run_due(self, now=None):
+        """
+        Run the hooks of the transitions due by `now` and return them,
+        reloading the heap first if a question changed or it is older
+        than POLLS_SCHEDULER_INTERVAL. Each transition is run once per
+        process.
+        """
+        now = now or timezone.now()
+        version = index_version()
+        with self._condition:
+            if version != self._version or self._loaded_at is None or \
+                    time.monotonic() - self._loaded_at \
+                    >= settings.POLLS_SCHEDULER_INTERVAL:
+                # transitions since the last run are still run, so that
+                # a change made meanwhile does not skip them
+                self._load(self._synced_at or now)
+                self._version = version
+            due = []
+            while self._heap and self._heap[0].when <= now:
+                due.append(heapq.heappop(self._heap))
+            if due:
+                self._active = None
+            if self._synced_at is None or now > self._synced_at:
+                self._synced_at = now
+        for transition in due:
+            for hook in self._hooks[transition.kind]:
+                try:
+                    hook(transition)
+                except Exception:
+                    logger.exception('Hook of %s failed', transition)
+        return due
+
+    def next_transition(self, now=None):
+        """Return the next transition after `now`, or None."""
+        self.run_due(now)
+        with self._condition:
+            return self._heap[0] if self._heap else None
+
+    def active_questions(self, now=None):
+        """
+        Return the ids of the questions open for voting, read again only
+        after a transition or a reload of the heap.
+        """
+        now = now or timezone.now()
+        self.run_due(now)
+        with self._condition:
+            if self._active is None:
+                self._active = frozenset(Question.objects
+                                         .filter(pub_date__lte=now)
+                                         .filter(Q(end_date__isnull=True)
+                                                 | Q(end_date__gte=now))
+                                         .values_list('pk', flat=True))
+            return self._active
+
+    def changed(self):
+        """Wake the background thread after a question changed."""
+        with self._condition:
+            self._condition.notify()
+
+    def start(self):
+        """Start the thread that runs transitions when they are due."""
+        with self._condition:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True, name='polls-scheduler')
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            # wake at the next transition, and now and then to notice the
+            # changes made by other processes
+            wait = settings.POLLS_SCHEDULER_INTERVAL
+            try:
+                upcoming = self.next_transition()
+            except Exception:
+                logger.exception('Could not run the due transitions')
+                upcoming = None
+            finally:
+                connections.close_all()
+            if upcoming is not None:
+                seconds = (upcoming.when - timezone.now()).total_seconds()
+                wait = max(0, min(wait, seconds))
+            with self._condition:
+                if self._stopping:
+                    return
+                self._condition.wait(wait)
+                if self._stopping:
+                    return
+
+
+def question_published(transition):
+    """Show a newly published question on the index."""
+    invalidate_index()
+
+
+def question_closed(transition):
+    """Freeze the results of a question the moment it closes."""
+    freeze_results(Question.objects.filter(pk=transition.question_id))
+    # a new version lets clients pick up the long-lived caching policy
+    invalidate_results([transition.question_id])
+
+
+scheduler = QuestionScheduler()
+scheduler.on(PUBLISH, question_published)
+scheduler.on(CLOSE, question_closed)
+
+
+def get_scheduler():
+    """Return the scheduler, starting its thread if configured to."""
+    if settings.POLLS_SCHEDULER_THREAD and scheduler._thread is None:
+        scheduler.start()
+    return scheduler
@@ -0,0 +1,181 @@
+"""This module contains the services used by the views of the application."""
+from typing import List, NamedTuple, Optional
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Sum, Window
+from django.utils import timezone
+
+from .models import Choice, Question, ResultSnapshot, Vote
+
+
+class ChoiceResult(NamedTuple):
+    """Vote count of one choice of a question."""
+
+    id: int
+    choice_text: str
+    votes: int
+    percentage: float
+
+
+class QuestionResults(NamedTuple):
+    """Vote counts of every choice of a question."""
+
+    question: Question
+    choices: List[ChoiceResult]
+    total: int
+
+
+def _results_query(question):
+    return question.choice_set.order_by('pk')\
+        .annotate(total=Window(Sum('vote_count')))\
+        .values_list('pk', 'choice_text', 'vote_count', 'total')
+
+
+def _snapshot(question):
+    """Return the valid snapshot fetched along with `question`, or None."""
+    # only a snapshot loaded by select_related('snapshot') is used, so
+    # looking for one never costs a query of its own
+    if not Question.snapshot.is_cached(question):
+        return None
+    try:
+        snapshot = question.snapshot
+    except ResultSnapshot.DoesNotExist:
+        return None
+    return snapshot if snapshot.is_valid_for(question) else None
+
+
+def _snapshot_rows(snapshot):
+    return [(pk, text, votes, snapshot.total)
+            for pk, text, votes in snapshot.choices]
+
+
+def question_results(question: Question) -> QuestionResults:
+    """
+    Return every choice of `question` with its vote count and percentage
+    and the total number of votes, using a single query, or none if the
+    question was fetched with its valid result snapshot.
+    """
+    snapshot = _snapshot(question)
+    if snapshot is not None:
+        return _results(question, _snapshot_rows(snapshot))
+    return _results(question, list(_results_query(question)))
+
+
+async def aquestion_results(question: Question) -> QuestionResults:
+    """Async version of question_results()."""
+    snapshot = _snapshot(question)
+    if snapshot is not None:
+        return _results(question, _snapshot_rows(snapshot))
+    rows = [row async for row in _results_query(question)]
+    return _results(question, rows)
+
+
+def _results(question, rows):
+    total = (rows[0][3] or 0) if rows else 0
+    choices = [
+        ChoiceResult(pk, text, votes,
+                     100 * votes / total if total else 0.0)
+        for pk, text, votes, _ in rows
+    ]
+    return QuestionResults(question, choices, total)
+
+
+def freeze_results(questions=None, refresh=False) -> int:
+    """
+    Store a ResultSnapshot of the final vote counts of every ended
+    question in `questions` (a queryset, all questions by default) that
+    has no valid snapshot yet, or of all of them if `refresh` is true.
+    Return the number of snapshots stored.
+    """
+    if questions is None:
+        questions = Question.objects.all()
+    ended = questions.filter(end_date__lt=timezone.localtime())
+    if not refresh:
+        ended = ended.exclude(snapshot__end_date=F('end_date'))
+    frozen = 0
+    for question in list(ended.only('pk', 'end_date')):
+        with transaction.atomic():
+            # count the Vote rows once rather than trusting the counters
+            rows = [list(row) for row in question.choice_set
+                    .order_by('pk').with_actual_votes()
+                    .values_list('pk', 'choice_text', 'actual_votes')]
+            ResultSnapshot.objects.update_or_create(
+                question=question, defaults={
+                    'end_date': question.end_date,
+                    'choices': rows,
+                    'total': sum(votes for _, _, votes in rows),
+                })
+        frozen += 1
+    return frozen
+
+
+class VoteOutcome(NamedTuple):
+    """What cast_vote() did to the vote of a user for a question."""
+
+    vote: Vote
+    created: bool
+    changed: bool
+    previous_choice_id: Optional[int]
+
+    @property
+    def kind(self):
+        """Return 'new', 'changed' or 'unchanged'."""
+        if self.created:
+            return 'new'
+        return 'changed' if self.changed else 'unchanged'
+
+
+def cast_vote(user, choice: Choice) -> VoteOutcome:
+    """
+    Record that `user` votes for `choice`, replacing the user's earlier
+    vote for the same question, in a single transaction.
+
+    Concurrent calls for the same user and question leave exactly one
+    vote: the unique (user, question) constraint rejects the loser's
+    INSERT, which is then retried as an update of the winner's row.
+    """
+    connection = connections[router.db_for_write(Vote)]
+    if connection.features.has_select_for_update:
+        cast = _lock_then_write
+    else:
+        # SQLite has no row locks; write first so that the transaction
+        # takes the database write lock before it reads anything.
+        cast = _write_then_read
+    try:
+        return cast(user, choice)
+    except IntegrityError:
+        # another request inserted the vote between our read and write
+        return cast(user, choice)
+
+
+@transaction.atomic
+def _lock_then_write(user, choice):
+    """Cast a vote while holding a row lock on the existing vote."""
+    vote = Vote.objects.select_for_update()\
+        .filter(user=user, question=choice.question_id).first()
+    if vote is None:
+        vote = Vote.objects.create(user=user, choice=choice)
+        return VoteOutcome(vote, True, True, None)
+    return _change_vote(vote, choice)
+
+
+@transaction.atomic
+def _write_then_read(user, choice):
+    """Cast a vote by inserting it and updating on conflict."""
+    try:
+        with transaction.atomic():
+            vote = Vote.objects.create(user=user, choice=choice)
+        return VoteOutcome(vote, True, True, None)
+    except IntegrityError:
+        vote = Vote.objects.get(user=user, question=choice.question_id)
+    return _change_vote(vote, choice)
+
+
+def _change_vote(vote, choice):
+    """Point an existing vote at `choice` if it is not already."""
+    previous_choice_id = vote.choice_id
+    if previous_choice_id == choice.pk:
+        return VoteOutcome(vote, False, False, previous_choice_id)
+    vote.choice = choice
+    vote.save(update_fields=['choice', 'question'])
+    return VoteOutcome(vote, False, True, previous_choice_id)
@@ -0,0 +1,89 @@
+"""Signal receivers of the polls application."""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mysite.auth import invalidate_user
+
+from .cache import (invalidate_index, invalidate_questions,
+                    invalidate_results, invalidate_user_votes)
+from .events import publish_counts
+from .models import Choice, Question, ResultSnapshot, Vote
+from .scheduler import scheduler
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached copies of a changed user (see mysite.auth)."""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    """
+    Drop the cached index page and results when a question changes, and
+    let the scheduler reload its transitions.
+    """
+    invalidate_index()
+    invalidate_results([instance.pk])
+    invalidate_questions([instance.pk])
+    # after the new index stamp, so that the scheduler reloads the
+    # committed rows
+    transaction.on_commit(scheduler.changed)
+
+
+@receiver(post_save, sender=Question)
+def question_reopened(sender, instance, raw, **kwargs):
+    """Drop the result snapshot of a question whose end_date changed."""
+    if raw:
+        return
+    ResultSnapshot.objects.filter(question=instance.pk)\
+        .exclude(end_date=instance.end_date).delete()
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    """
+    Give the results of the question of a changed choice a new version
+    and drop its result snapshot, which has the old choices.
+    """
+    invalidate_results([instance.question_id])
+    invalidate_questions([instance.question_id])
+    ResultSnapshot.objects.filter(question=instance.question_id).delete()
+
+
+@receiver(post_save, sender=Vote)
+def count_saved_vote(sender, instance, created, raw, **kwargs):
+    """Move the vote counters when a vote is created or switched."""
+    if raw:
+        # fixtures are loaded as-is; run `manage.py recount_votes` after.
+        return
+    old_choice_id = instance._stored_choice_id
+    deltas = {}
+    if created:
+        deltas = {instance.choice_id: 1}
+    elif old_choice_id is None:
+        # we do not know what the row pointed at before, so rebuild.
+        Choice.objects.filter(question=instance.question_id)\
+            .recount_votes()
+        publish_counts([instance.question_id])
+    elif old_choice_id != instance.choice_id:
+        deltas = {old_choice_id: -1, instance.choice_id: 1}
+    for choice_id, delta in deltas.items():
+        Choice.objects.filter(pk=choice_id).add_votes(delta)
+    if deltas:
+        publish_counts([instance.question_id])
+    invalidate_user_votes([instance.user_id])
+    instance._stored_choice_id = instance.choice_id
+
+
+@receiver(post_delete, sender=Vote)
+def count_deleted_vote(sender, instance, **kwargs):
+    """Take a deleted vote (also by cascade) off its choice counter."""
+    choice_id = instance._stored_choice_id or instance.choice_id
+    Choice.objects.filter(pk=choice_id).add_votes(-1)
+    publish_counts([instance.question_id])
+    invalidate_user_votes([instance.user_id])
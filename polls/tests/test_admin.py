@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.admin import EstimatedCountPaginator
+from polls.models import Question, Vote
+
+from .base import create_question, create_choice
+
+
+class AdminTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='admin',
+                                                   password='pw')
+        self.client.force_login(self.admin)
+        self.questions = []
+        for number in range(3):
+            question = create_question(question_text=f'Q{number}.', days=-1)
+            choice = create_choice(question, 'choice')
+            for voter in range(number + 1):
+                user = User.objects.create_user(
+                    username=f'voter{number}-{voter}')
+                Vote.objects.create(user=user, choice=choice)
+            self.questions.append(question)
+
+    def changelist(self, model, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(
+                reverse(f'admin:polls_{model}_changelist'), data)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in captured]
+
+    def test_question_totals_in_one_query(self):
+        """The vote totals are annotated, not counted per question."""
+        response, queries = self.changelist('question')
+        self.assertEqual(
+            [row.total_votes for row in response.context['cl'].result_list],
+            [3, 2, 1])
+        Question.objects.filter(pk__in=[q.pk for q in self.questions[1:]])\
+            .delete()
+        _, fewer = self.changelist('question')
+        self.assertEqual(len(queries), len(fewer))
+
+    def test_votes_with_related_rows(self):
+        """The votes are listed with their user, question and choice."""
+        response, queries = self.changelist('vote')
+        self.assertContains(response, 'voter2-2')
+        self.assertEqual(len([sql for sql in queries
+                              if 'FROM "auth_user"' in sql]), 1)
+
+    def test_votes_not_counted(self):
+        """A large vote table is not counted to paginate it."""
+        with mock.patch.object(EstimatedCountPaginator, 'ceiling', 1):
+            response, queries = self.changelist('vote')
+        self.assertEqual(response.context['cl'].result_count, 6)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+
+    def test_filtered_votes_counted_up_to_ceiling(self):
+        """A filtered list is counted, but no further than the ceiling."""
+        with mock.patch.object(EstimatedCountPaginator, 'ceiling', 1):
+            response, _ = self.changelist('vote', {'q': 'voter2-0'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response, _ = self.changelist('vote', {'q': 'voter2'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_estimate_shown_as_approximate(self):
+        """A count that is an estimate says so."""
+        with mock.patch.object(EstimatedCountPaginator, 'ceiling', 1):
+            response, _ = self.changelist('vote')
+        self.assertContains(response, 'About 6 votes')
+        response, _ = self.changelist('vote')
+        self.assertNotContains(response, 'About')
+
+    def test_pages_past_ceiling_reachable(self):
+        """A filtered list longer than the ceiling pages up to the estimate."""
+        votes = Vote.objects.filter(pk__gt=0).order_by('pk')
+        with mock.patch.object(EstimatedCountPaginator, 'ceiling', 1):
+            paginator = EstimatedCountPaginator(votes, 2)
+            self.assertEqual(paginator.count, 6)
+            self.assertTrue(paginator.approximate)
+            self.assertEqual(len(paginator.page(3).object_list), 2)
+        Vote.objects.filter(pk__in=votes.values('pk')[:3]).delete()
+        with mock.patch.object(EstimatedCountPaginator, 'ceiling', 1):
+            paginator = EstimatedCountPaginator(votes.all(), 2)
+            # the estimate still counts the deleted rows
+            self.assertEqual(paginator.num_pages, 3)
+            self.assertFalse(paginator.page(paginator.num_pages)
+                             .object_list)
@@ -0,0 +1,211 @@
+import datetime
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import results_version
+from polls.models import Choice, Question, Vote
+
+from .base import create_question, create_choice
+
+
+class QuestionApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_published_questions(self):
+        """Only published questions are listed, newest first."""
+        old = create_question(question_text='Old.', days=-2)
+        new = create_question(question_text='New.', days=-1)
+        create_question(question_text='Future.', days=1)
+        response = self.client.get(reverse('polls:api_questions'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([q['id'] for q in data['questions']],
+                         [new.pk, old.pk])
+        self.assertIsNone(data['next'])
+
+    def test_invalid_cursor(self):
+        """A cursor that cannot be decoded is answered with a 404."""
+        response = self.client.get(reverse('polls:api_questions'),
+                                   {'after': '!!'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_question_with_choices(self):
+        """A published question is returned with its choices."""
+        question = create_question(question_text='Test.', days=-1)
+        choice = create_choice(question, 'choice 1')
+        response = self.client.get(reverse('polls:api_question',
+                                           args=(question.pk,)))
+        self.assertEqual(response.json()['choices'],
+                         [{'id': choice.pk, 'choice_text': 'choice 1'}])
+
+    def test_future_question(self):
+        """An unpublished question is not found."""
+        question = create_question(question_text='Future.', days=1)
+        for name in ('polls:api_question', 'polls:api_results'):
+            response = self.client.get(reverse(name, args=(question.pk,)))
+            self.assertEqual(response.status_code, 404)
+
+
+class ResultsApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+        self.url = reverse('polls:api_results', args=(self.question.pk,))
+
+    def test_results(self):
+        """The results carry the counts and the total."""
+        user = User.objects.create_user(username='a')
+        Vote.objects.create(user=user, choice=self.choice)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['choices'][0]['votes'], 1)
+        self.assertEqual(data['choices'][0]['percentage'], 100.0)
+
+    def test_not_modified_without_counting(self):
+        """
+        A client with the current ETag gets a 304 after only looking up
+        the question and the version of its results.
+        """
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_shared_without_vary(self):
+        """The results do not depend on the user, so they do not vary."""
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertNotIn('Vary', response)
+
+    def test_not_modified_since(self):
+        """Last-Modified can be used for conditional requests too."""
+        response = self.client.get(self.url)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_changes_etag(self):
+        """A committed vote gives the results a new ETag."""
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user(username='a')
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(user=user, choice=self.choice)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total'], 1)
+
+    def test_version_is_shared_by_processes(self):
+        """
+        The ETag changes with a vote counted by another process, whose
+        cache this process does not see.
+        """
+        etag = self.client.get(self.url)['ETag']
+        Choice.objects.filter(pk=self.choice.pk).add_votes(1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 1)
+
+    def test_version_follows_commits(self):
+        """
+        A vote committed later changes the ETag, even when the process that
+        counted it has a clock behind the one of the previous vote.
+        """
+        other = create_choice(self.question, 'choice 2')
+        Choice.objects.filter(pk=self.choice.pk).add_votes(1)
+        etag = self.client.get(self.url)['ETag']
+        behind = time.time_ns() - 10 * 1_000_000_000
+        with mock.patch('time.time_ns', return_value=behind):
+            Choice.objects.filter(pk=other.pk).add_votes(1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 2)
+
+    def test_save_keeps_newer_version(self):
+        """Saving a question read before a vote moves on from its version."""
+        question = Question.objects.get(pk=self.question.pk)
+        Choice.objects.filter(pk=self.choice.pk).add_votes(1)
+        version = results_version(self.question.pk)
+        question.question_text = 'Edited.'
+        with mock.patch('time.time_ns', return_value=0):
+            question.save()
+        self.assertGreater(results_version(self.question.pk), version)
+
+    def test_question_change_changes_etag(self):
+        """Editing the question gives the results a new ETag."""
+        etag = self.client.get(self.url)['ETag']
+        self.question.question_text = 'Edited.'
+        self.question.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_choice_change_changes_etag(self):
+        """Editing a choice gives the results a new ETag."""
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_choice(self.question, 'choice 2')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class VoteApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='pw')
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+        self.url = reverse('polls:api_vote', args=(self.question.pk,))
+
+    def test_login_required(self):
+        """Anonymous votes are refused."""
+        response = self.client.post(self.url, {'choice': self.choice1.pk})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_vote_and_change(self):
+        """The first vote is created, the next one replaces it."""
+        self.client.login(username='a', password='pw')
+        response = self.client.post(self.url, {'choice': self.choice1.pk})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(self.url, {'choice': self.choice2.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['changed'])
+        self.assertEqual(Vote.objects.get().choice, self.choice2)
+
+    def test_missing_choice(self):
+        """A vote without a valid choice is a bad request."""
+        self.client.login(username='a', password='pw')
+        for data in ({}, {'choice': 'x'}, {'choice': 0}):
+            response = self.client.post(self.url, data)
+            self.assertEqual(response.status_code, 400)
+
+    def test_ended_question(self):
+        """Votes on an ended question are refused."""
+        self.question.end_date = timezone.localtime() \
+            - datetime.timedelta(hours=1)
+        self.question.save()
+        self.client.login(username='a', password='pw')
+        response = self.client.post(self.url, {'choice': self.choice1.pk})
+        self.assertEqual(response.status_code, 403)
+
+    def test_csrf_enforced(self):
+        """The API keeps the CSRF protection of the session login."""
+        client = self.client_class(enforce_csrf_checks=True)
+        client.login(username='a', password='pw')
+        response = client.post(self.url, {'choice': self.choice1.pk})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Vote.objects.exists())
@@ -0,0 +1,66 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+
+from mysite import views as site_views
+from polls import api, async_views, views
+
+from .base import create_question, create_choice
+
+polls_patterns = ([
+    path('', async_views.IndexView.as_view(), name='index'),
+    path('all/', views.all_questions, name='all'),
+    path('<int:pk>/', async_views.DetailView.as_view(), name='detail'),
+    path('<int:pk>/results/', async_views.ResultsView.as_view(),
+         name='results'),
+    path('<int:pk>/results/stream/', views.results_stream,
+         name='results_stream'),
+    path('<int:question_id>/vote/', async_views.vote_view, name='vote'),
+    path('api/questions/<int:pk>/results/', api.results,
+         name='api_results'),
+], 'polls')
+
+urlpatterns = [
+    path('polls/', include(polls_patterns)),
+    path('accounts/', include('django.contrib.auth.urls')),
+    path('signup/', site_views.signup, name='signup'),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        """Set up a user and a question with a choice."""
+        cache.clear()
+        User.objects.create_user(username='test_user', password='secret')
+        self.question = create_question(question_text='Past question.',
+                                        days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+
+    async def test_index(self):
+        """The async index lists the published questions."""
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'Past question.')
+
+    async def test_detail_needs_login(self):
+        """The async detail page redirects anonymous users to login."""
+        url = reverse('polls:detail', args=(self.question.id,))
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_vote_then_results(self):
+        """Voting through sync_to_async shows up on the async results."""
+        await sync_to_async(self.async_client.login)(username='test_user',
+                                                     password='secret')
+        url = reverse('polls:detail', args=(self.question.id,))
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'choice 1')
+        await self.async_client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.choice.id})
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual(response.context['results'].total, 1)
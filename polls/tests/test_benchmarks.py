@@ -0,0 +1,74 @@
+import importlib
+import json
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+
+from polls.benchmarks import BENCHMARKS, compare
+
+
+class CompareTests(SimpleTestCase):
+
+    def test_regressions(self):
+        """Slower, busier or less productive runs are flagged."""
+        baseline = {'index': {'latency': {'p50_ms': 10.0, 'count': 100},
+                              'queries_per_request': 2.0},
+                    'requests_per_second': 100.0}
+        current = {'index': {'latency': {'p50_ms': 10.5, 'count': 50},
+                             'queries_per_request': 3.0},
+                   'requests_per_second': 80.0}
+        self.assertEqual(
+            [r['metric'] for r in compare(baseline, current, 0.1)],
+            ['index.queries_per_request', 'requests_per_second'])
+
+    def test_improvements_and_new_metrics(self):
+        """Faster runs and metrics missing from the baseline pass."""
+        baseline = {'latency': {'p99_ms': 10.0}}
+        current = {'latency': {'p99_ms': 5.0}, 'votes_per_second': 1.0}
+        self.assertEqual(compare(baseline, current), [])
+
+
+
+class BenchmarkSmokeTests(TransactionTestCase):
+    """Every benchmark runs on a tiny data set."""
+
+    options = {'questions': 3, 'choices': 2, 'users': 3,
+               'votes_per_user': 1, 'repeat': 2, 'threads': 2,
+               'iterations': 1}
+
+    def run_benchmark(self, name):
+        cache.clear()
+        benchmark = importlib.import_module(f'polls.benchmarks.{name}')
+        results = benchmark.run(**self.options)
+        self.assertTrue(json.dumps(results))
+
+    def test_all_smoke_tested(self):
+        """A new benchmark gets its smoke test."""
+        self.assertEqual(
+            sorted(name[len('test_'):] for name in dir(self)
+                   if name.startswith('test_') and name[5:] in BENCHMARKS),
+            BENCHMARKS)
+
+    def test_endpoints(self):
+        """The endpoints benchmark runs."""
+        self.run_benchmark('endpoints')
+
+    def test_render(self):
+        """The render benchmark runs."""
+        self.run_benchmark('render')
+
+    def test_server(self):
+        """The server benchmark runs."""
+        self.run_benchmark('server')
+
+    def test_signup(self):
+        """The signup benchmark runs."""
+        self.run_benchmark('signup')
+
+    def test_vote_lookup(self):
+        """The vote_lookup benchmark runs."""
+        self.run_benchmark('vote_lookup')
+
+    def test_vote_throughput(self):
+        """The vote_throughput benchmark runs."""
+        self.run_benchmark('vote_throughput')
@@ -1,9 +1,15 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from django.contrib.auth.models import User
 
-from .base import create_question
+from polls.cache import user_votes
+from polls.models import Vote
+
+from .base import create_question, create_choice
 
 
 class QuestionDetailViewTests(TestCase):
@@ -16,6 +22,7 @@ class QuestionDetailViewTests(TestCase):
         }
         self.user = User.objects.create_user(**self.credentials)
         self.user.save()
+        cache.clear()
 
     def test_future_question(self):
         """
@@ -39,3 +46,67 @@ class QuestionDetailViewTests(TestCase):
         url = reverse('polls:detail', args=(past_question.id, ))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+    def test_private_and_conditional(self):
+        """
+        The page shows the user's own vote, so it is private, varies on
+        the cookie and is revalidated with its ETag.
+        """
+        self.client.login(username='test_user', password='secret')
+        question = create_question(question_text='Past question.', days=-5)
+        url = reverse('polls:detail', args=(question.id, ))
+        # the first page sets the CSRF cookie the next ones depend on
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        response = self.client.get(url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_selected_choice_by_id(self):
+        """The choice the user voted for is checked, found by its id."""
+        self.client.login(username='test_user', password='secret')
+        question = create_question(question_text='Past question.', days=-5)
+        create_choice(question, 'same text')
+        choice = create_choice(question, 'same text')
+        Vote.objects.create(user=self.user, choice=choice)
+        response = self.client.get(reverse('polls:detail',
+                                           args=(question.id, )))
+        self.assertEqual(response.context['selected_choice'], choice.id)
+        self.assertContains(response, f'value="{choice.id}" checked')
+        self.assertContains(response, 'checked', count=1)
+
+    def test_user_votes_are_cached(self):
+        """
+        The votes of a user are read in one query, and again only after
+        the user votes.
+        """
+        question = create_question(question_text='Past question.', days=-5)
+        choice = create_choice(question, 'choice 1')
+        with self.assertNumQueries(1):
+            self.assertEqual(user_votes(self.user.pk), {})
+        with self.assertNumQueries(0):
+            user_votes(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(user=self.user, choice=choice)
+        self.assertEqual(user_votes(self.user.pk), {question.pk: choice.pk})
+
+    @override_settings(POLLS_USER_VOTES_TIMEOUT=3600,
+                       POLLS_USER_VOTES_LOCAL_TIMEOUT=5)
+    def test_user_votes_of_other_processes(self):
+        """
+        With a cache of each process, a vote cast through another process
+        is seen after POLLS_USER_VOTES_LOCAL_TIMEOUT.
+        """
+        question = create_question(question_text='Past question.', days=-5)
+        choice = create_choice(question, 'choice 1')
+        with mock.patch('time.time', return_value=1000):
+            self.assertEqual(user_votes(self.user.pk), {})
+        # another process votes, this one's stamp stays the same
+        Vote.objects.create(user=self.user, choice=choice)
+        with mock.patch('time.time', return_value=1004):
+            self.assertEqual(user_votes(self.user.pk), {})
+        with mock.patch('time.time', return_value=1006):
+            self.assertEqual(user_votes(self.user.pk),
+                             {question.pk: choice.pk})
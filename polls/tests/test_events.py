@@ -0,0 +1,123 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.events import VotePublisher, publisher
+from polls.services import cast_vote
+
+from .base import create_question, create_choice
+
+
+class VotePublisherTests(TestCase):
+
+    async def test_newest_counts_win(self):
+        """Counts published before the client reads them are replaced."""
+        events = VotePublisher()
+        subscription = events.subscribe(1)
+        events.publish(1, {10: 1, 11: 0})
+        events.publish(1, {10: 2, 11: 1})
+        events.publish(2, {20: 1})
+        await asyncio.sleep(0)
+        event = await events.next_event(subscription, 1)
+        self.assertEqual(event, {'counts': {10: 2, 11: 1}})
+        self.assertIsNone(await events.next_event(subscription, 0.01))
+
+    async def test_unsubscribe(self):
+        """A question without subscriptions is not watched."""
+        events = VotePublisher()
+        subscription = events.subscribe(1)
+        self.assertTrue(events.is_watched(1))
+        events.unsubscribe(subscription)
+        self.assertFalse(events.is_watched(1))
+
+
+class ResultsStreamTests(TestCase):
+
+    def setUp(self):
+        """Set up a user, a question and a choice."""
+        self.user = User.objects.create_user(username='test_user')
+        self.question = create_question(question_text='test', days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+
+    def vote(self):
+        """Vote for the choice and run what waits for the commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            cast_vote(self.user, self.choice)
+
+    async def test_stream_sends_counts(self):
+        """The stream starts with the counts and sends them after votes."""
+        url = reverse('polls:results_stream', args=(self.question.id,))
+        response = await self.async_client.get(url)
+        # the test client does not close the view's generator
+        self.addCleanup(publisher._subscriptions.pop, self.question.id, None)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        first = await anext(events)
+        self.assertEqual(json.loads(first[len('data: '):]),
+                         {'counts': {str(self.choice.id): 0}})
+        self.assertTrue(publisher.is_watched(self.question.id))
+        await sync_to_async(self.vote)()
+        second = await anext(events)
+        self.assertEqual(json.loads(second[len('data: '):]),
+                         {'counts': {str(self.choice.id): 1}})
+
+    async def test_vote_before_first_counts_is_not_counted_twice(self):
+        """A vote committed while the client subscribes is counted once."""
+        url = reverse('polls:results_stream', args=(self.question.id,))
+        publish_current = publisher.publish_current
+
+        def vote_then_publish(*args):
+            # committed after the subscription, before the first counts
+            self.vote()
+            publish_current(*args)
+
+        with mock.patch.object(publisher, 'publish_current',
+                               vote_then_publish):
+            response = await self.async_client.get(url)
+        self.addCleanup(publisher._subscriptions.pop, self.question.id, None)
+        first = await anext(aiter(response.streaming_content))
+        self.assertEqual(json.loads(first[len('data: '):]),
+                         {'counts': {str(self.choice.id): 1}})
+        self.assertIsNone(await publisher.next_event(
+            next(iter(publisher._subscriptions[self.question.id])), 0.01))
+
+    def test_vote_publishes_counts(self):
+        """A committed vote is published to the watchers of its question."""
+        published = []
+        publisher._subscriptions[self.question.id] = {_Recorder(published)}
+        try:
+            self.vote()
+        finally:
+            del publisher._subscriptions[self.question.id]
+        self.assertEqual(published, [{self.choice.id: 1}])
+
+    def test_no_stream_under_wsgi(self):
+        """Under WSGI the stream answers 204 and the page polls instead."""
+        url = reverse('polls:results_stream', args=(self.question.id,))
+        self.assertEqual(self.client.get(url).status_code, 204)
+        self.assertFalse(publisher.is_watched(self.question.id))
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        self.assertNotContains(response, 'data-stream=')
+        self.assertContains(response, 'data-poll=')
+
+    async def test_unknown_question(self):
+        """Streaming an unknown question gives a 404."""
+        url = reverse('polls:results_stream', args=(self.question.id + 1,))
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
+class _Recorder:
+    """Subscription stand-in recording what is pushed to it."""
+
+    def __init__(self, published):
+        self.published = published
+
+    def _push(self, counts):
+        self.published.append(counts)
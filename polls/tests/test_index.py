@@ -1,11 +1,30 @@
-from django.test import TestCase
+import datetime
+import tempfile
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import published_questions
+from polls.models import Question
+from polls.pagination import akeyset_page, keyset_page
+from polls.rendering import detail_url, question_links, results_url
 
 from .base import create_question
 
 
 class QuestionIndexViewTests(TestCase):
 
+    def setUp(self):
+        """Start every test without a cached index page."""
+        cache.clear()
+
     def test_no_questions(self):
         """
         If no questions exist, an appropriate messsage is displayed.
@@ -64,3 +83,230 @@ class QuestionIndexViewTests(TestCase):
             response.context['latest_question_list'],
             [question2, question1],
         )
+
+
+class QuestionIndexCacheTests(TestCase):
+
+    def setUp(self):
+        """Start every test without a cached index page."""
+        cache.clear()
+
+    def test_cached_list_is_reused(self):
+        """A second visit does not query the questions again."""
+        create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+
+    def test_saving_question_invalidates(self):
+        """A newly published or edited question shows up at once."""
+        question = create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            question.question_text = "Edited question."
+            question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Edited question.")
+
+    def test_deleting_question_invalidates(self):
+        """A deleted question disappears at once."""
+        question = create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "No polls are available.")
+
+    def test_expires_at_next_pub_date(self):
+        """The cache expires when the next question gets published."""
+        create_question(question_text="Past question.", days=-1)
+        soon = timezone.localtime() + datetime.timedelta(seconds=30)
+        Question.objects.create(question_text="Soon.", pub_date=soon)
+        self.assertLessEqual(published_questions().timeout, 30)
+
+    @override_settings(POLLS_INDEX_LOCAL_TIMEOUT=5)
+    def test_changes_of_another_process(self):
+        """
+        With a cache per process, a question published through another
+        process shows up once the local timeout has passed.
+        """
+        create_question(question_text="First.", days=-1)
+        self.client.get(reverse('polls:index'))
+        # the commit hooks do not run, like in another process
+        create_question(question_text="Second.", days=-1)
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Second.")
+
+    def test_welcome_is_not_shared(self):
+        """The welcome message stays per user while the list is shared."""
+        create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        User.objects.create_user(username='test_user', password='secret')
+        self.client.login(username='test_user', password='secret')
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Welcome back, Test_User")
+        self.assertContains(response, "Past question.")
+
+    def test_votes_of_user_are_marked(self):
+        """The questions the user voted for are marked for that user only."""
+        voted = create_question(question_text="Voted.", days=-1)
+        create_question(question_text="Not voted.", days=-2)
+        choice = voted.choice_set.create(choice_text='choice 1')
+        user = User.objects.create_user(username='test_user',
+                                        password='secret')
+        user.vote_set.create(choice=choice)
+        self.client.get(reverse('polls:index'))
+        self.client.login(username='test_user', password='secret')
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "You voted", count=1)
+        self.client.logout()
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, "You voted")
+
+    def test_file_based_cache(self):
+        """Caching and invalidation also work with the file backend."""
+        with tempfile.TemporaryDirectory() as location:
+            backend = 'django.core.cache.backends.filebased.FileBasedCache'
+            with override_settings(CACHES={'default': {
+                    'BACKEND': backend, 'LOCATION': location}}):
+                create_question(question_text="First.", days=-1)
+                self.client.get(reverse('polls:index'))
+                with self.captureOnCommitCallbacks(execute=True):
+                    create_question(question_text="Second.", days=-1)
+                response = self.client.get(reverse('polls:index'))
+                self.assertContains(response, "Second.")
+
+
+@override_settings(POLLS_INDEX_PAGE_SIZE=2)
+class QuestionIndexPaginationTests(TestCase):
+
+    def setUp(self):
+        """Create five past questions, the newest one last."""
+        cache.clear()
+        self.questions = [
+            create_question(question_text=f"Question {i}.", days=i - 10)
+            for i in range(5)
+        ]
+        self.questions.reverse()
+
+    def test_next_and_previous_pages(self):
+        """Following the cursors walks the questions in order and back."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertEqual(response.context['latest_question_list'],
+                         self.questions[:2])
+        self.assertIsNone(response.context['page'].previous_cursor)
+        after = response.context['page'].next_cursor
+        response = self.client.get(reverse('polls:index'), {'after': after})
+        self.assertEqual(response.context['latest_question_list'],
+                         self.questions[2:4])
+        after = response.context['page'].next_cursor
+        response = self.client.get(reverse('polls:index'), {'after': after})
+        self.assertEqual(response.context['latest_question_list'],
+                         self.questions[4:])
+        self.assertIsNone(response.context['page'].next_cursor)
+        before = response.context['page'].previous_cursor
+        response = self.client.get(reverse('polls:index'),
+                                   {'before': before})
+        self.assertEqual(response.context['latest_question_list'],
+                         self.questions[2:4])
+
+    def test_numbering_goes_on(self):
+        """The questions of the next pages are numbered after the first."""
+        response = self.client.get(reverse('polls:index'))
+        after = response.context['page'].next_cursor
+        response = self.client.get(reverse('polls:index'), {'after': after})
+        self.assertContains(response, "3. Question 2.")
+        self.assertContains(response, "4. Question 1.")
+        after = response.context['page'].next_cursor
+        response = self.client.get(reverse('polls:index'), {'after': after})
+        self.assertContains(response, "5. Question 0.")
+        before = response.context['page'].previous_cursor
+        response = self.client.get(reverse('polls:index'),
+                                   {'before': before})
+        self.assertContains(response, "3. Question 2.")
+
+    def test_async_offset(self):
+        """The async pages count the questions before them too."""
+        published = Question.objects.all()
+        page = keyset_page(published, 2)
+        page = async_to_sync(akeyset_page)(published, 2,
+                                           after=page.next_cursor)
+        self.assertEqual(page.offset, 2)
+
+    def test_same_pub_date(self):
+        """Questions sharing a pub_date are neither skipped nor repeated."""
+        Question.objects.update(pub_date=timezone.localtime())
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('polls:index'), params)
+            seen += response.context['latest_question_list']
+            if not response.context['page'].next_cursor:
+                break
+            params = {'after': response.context['page'].next_cursor}
+        self.assertEqual(sorted(q.pk for q in seen),
+                         sorted(q.pk for q in self.questions))
+
+    def test_invalid_cursor(self):
+        """A malformed cursor gives a 404."""
+        response = self.client.get(reverse('polls:index'),
+                                   {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_questions_are_streamed(self):
+        """The full listing streams every published question."""
+        create_question(question_text="Future question.", days=30)
+        response = self.client.get(reverse('polls:all'))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        for question in self.questions:
+            self.assertIn(question.question_text, content)
+        self.assertNotIn("Future question.", content)
+
+
+class QuestionLinksTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Past.', days=-1)
+
+    def test_urls_reversed_once(self):
+        """The URLs filled in for each question are those of reverse()."""
+        for pk in (1, self.question.pk, 123456):
+            self.assertEqual(detail_url(pk),
+                             reverse('polls:detail', args=(pk,)))
+            self.assertEqual(results_url(pk),
+                             reverse('polls:results', args=(pk,)))
+
+    def test_links_follow_the_question(self):
+        """An open question has a vote link, a closed one does not."""
+        other = create_question(question_text='Other.', days=-2)
+        links = question_links([self.question, other], {self.question.pk})
+        self.assertIn('Vote', links[self.question.pk])
+        self.assertIn(f'href="{detail_url(self.question.pk)}"',
+                      links[self.question.pk])
+        self.assertIn(f'href="{results_url(self.question.pk)}"',
+                      links[self.question.pk])
+        self.assertNotIn('Vote', links[other.pk])
+        self.assertIn(f'href="{results_url(other.pk)}"', links[other.pk])
+
+    def test_rendered_once_per_list(self):
+        """
+        The links template is rendered twice for a whole list, and nothing
+        is written to the cache.
+        """
+        questions = [create_question(question_text=f'Q{number}.', days=-1)
+                     for number in range(5)]
+        template = get_template('polls/question_links.html')
+        with mock.patch('polls.rendering.get_template',
+                        return_value=template), \
+                mock.patch.object(template, 'render',
+                                  wraps=template.render) as render, \
+                mock.patch.object(cache, 'set_many') as set_many:
+            links = question_links(questions, {questions[0].pk})
+        self.assertEqual(render.call_count, 2)
+        set_many.assert_not_called()
+        self.assertEqual(len(links), 5)
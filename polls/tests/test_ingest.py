@@ -0,0 +1,148 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from polls import ingest
+from polls.models import Choice, Vote
+from polls.models.choice import ChoiceQuerySet
+
+from .base import create_question, create_choice
+
+
+class VoteQueueTests(TestCase):
+
+    def setUp(self):
+        """Set up two users, a question and two choices."""
+        self.user1 = User.objects.create_user(username='user1')
+        self.user2 = User.objects.create_user(username='user2')
+        self.question = create_question(question_text='test', days=-1)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+
+    def assertVotes(self, choice, count):
+        """Assert the stored counter of `choice`."""
+        choice.refresh_from_db()
+        self.assertEqual(choice.vote_count, count)
+
+    def test_flush_keeps_last_vote(self):
+        """Queued votes are written once, the last vote winning."""
+        queue = ingest.VoteQueue()
+        queue.put(self.user1.pk, self.question.pk, self.choice1.pk)
+        queue.put(self.user1.pk, self.question.pk, self.choice2.pk)
+        queue.put(self.user2.pk, self.question.pk, self.choice2.pk)
+        self.assertEqual(Vote.objects.count(), 0)
+        self.assertEqual(queue.flush(), 2)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(Vote.objects.get(user=self.user1).choice,
+                         self.choice2)
+        self.assertVotes(self.choice1, 0)
+        self.assertVotes(self.choice2, 2)
+
+    def test_flush_updates_existing_vote(self):
+        """A queued vote replaces the stored vote of the user."""
+        Vote.objects.create(user=self.user1, choice=self.choice1)
+        queue = ingest.VoteQueue()
+        queue.put(self.user1.pk, self.question.pk, self.choice2.pk)
+        queue.flush()
+        self.assertEqual(Vote.objects.get(user=self.user1).choice,
+                         self.choice2)
+        self.assertVotes(self.choice1, 0)
+        self.assertVotes(self.choice2, 1)
+
+    def test_deleted_user_or_choice_is_dropped(self):
+        """
+        A queued vote whose user or choice was deleted is dropped, and
+        the other votes of the batch are written.
+        """
+        user3 = User.objects.create_user(username='user3')
+        choice3 = create_choice(self.question, 'choice 3')
+        queue = ingest.VoteQueue()
+        queue.put(self.user1.pk, self.question.pk, self.choice1.pk)
+        queue.put(self.user2.pk, self.question.pk, choice3.pk)
+        queue.put(user3.pk, self.question.pk, self.choice2.pk)
+        user3.delete()
+        choice3.delete()
+        with self.assertLogs('polls.ingest', 'WARNING'):
+            self.assertEqual(queue.flush(), 1)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(Vote.objects.get().user, self.user1)
+        self.assertVotes(self.choice1, 1)
+        self.assertVotes(self.choice2, 0)
+
+    def test_counters_move_without_recount(self):
+        """
+        Only the counters of the choices that gained or lost votes are
+        written, without counting the votes of the question.
+        """
+        Vote.objects.create(user=self.user1, choice=self.choice1)
+        Vote.objects.create(user=self.user2, choice=self.choice2)
+        queue = ingest.VoteQueue()
+        queue.put(self.user1.pk, self.question.pk, self.choice2.pk)
+        queue.put(self.user2.pk, self.question.pk, self.choice2.pk)
+        with mock.patch.object(ChoiceQuerySet, 'recount_votes') as recount:
+            queue.flush()
+        recount.assert_not_called()
+        self.assertVotes(self.choice1, 0)
+        self.assertVotes(self.choice2, 2)
+
+    def test_replay_after_crash(self):
+        """Votes left in a journal are written by replay_votes."""
+        with tempfile.TemporaryDirectory() as directory:
+            queue = ingest.VoteQueue(directory)
+            queue.put(self.user1.pk, self.question.pk, self.choice1.pk)
+            queue.put(self.user1.pk, self.question.pk, self.choice2.pk)
+            # the process dies without draining its queue
+            queue._journal.close()
+            call_command('replay_votes', directory=directory,
+                         stdout=StringIO())
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(Vote.objects.get(user=self.user1).choice,
+                         self.choice2)
+        self.assertVotes(self.choice2, 1)
+
+    def test_restart_keeps_crashed_journal(self):
+        """A queue started with the pid of a crashed one keeps its journal."""
+        with tempfile.TemporaryDirectory() as directory:
+            crashed = ingest.VoteQueue(directory)
+            crashed.put(self.user1.pk, self.question.pk, self.choice1.pk)
+            crashed._journal.close()
+            queue = ingest.VoteQueue(directory)
+            queue.put(self.user2.pk, self.question.pk, self.choice2.pk)
+            queue.flush()
+            queue.drain()
+            self.assertTrue(os.path.exists(crashed._journal_path))
+            call_command('replay_votes', directory=directory,
+                         stdout=StringIO())
+        self.assertEqual(Vote.objects.get(user=self.user1).choice,
+                         self.choice1)
+        self.assertVotes(self.choice2, 1)
+
+
+@override_settings(POLLS_VOTE_INGESTION='queue',
+                   POLLS_VOTE_FLUSH_INTERVAL=3600)
+class QueuedVoteViewTests(TransactionTestCase):
+
+    def tearDown(self):
+        """Do not leave a flusher thread behind."""
+        ingest.drain_vote_queue()
+
+    def test_vote_is_queued_then_drained(self):
+        """The vote view queues the vote and draining writes it."""
+        user = User.objects.create_user(username='user1', password='secret')
+        question = create_question(question_text='test', days=-1)
+        choice = create_choice(question, 'choice 1')
+        self.client.login(username='user1', password='secret')
+        response = self.client.post(reverse('polls:vote',
+                                            args=(question.id,)),
+                                    {'choice': choice.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Vote.objects.exists())
+        ingest.drain_vote_queue()
+        self.assertEqual(Vote.objects.get(user=user).choice, choice)
+        self.assertEqual(Choice.objects.get(pk=choice.pk).vote_count, 1)
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.template.base import Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from mysite.middleware import QueryBudgetExceeded
+
+from .base import create_question, create_choice
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class QueryInstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Test.', days=-1)
+        create_choice(self.question, 'choice 1')
+        self.url = reverse('polls:results', args=(self.question.pk,))
+
+    def test_server_timing(self):
+        """The queries and their time are sent in Server-Timing."""
+        response = self.client.get(self.url)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_log_line(self):
+        """Every request is logged with the numbers of its view."""
+        with self.assertLogs('mysite.queries', 'INFO') as logs:
+            self.client.get(self.url)
+        stats = logs.records[0].query_stats
+        self.assertEqual(stats['view'], 'polls:results')
+        self.assertGreater(stats['queries'], 0)
+        self.assertGreater(stats['render_ms'], 0)
+        self.assertIn('view=polls:results', logs.output[0])
+
+    def test_templates_not_patched(self):
+        """Render time comes from the template engine, not a patch."""
+        with self.assertLogs('mysite.queries', 'INFO') as logs:
+            self.client.get(self.url)
+        self.assertFalse(hasattr(Template._render, 'timed'))
+        self.assertGreater(logs.records[0].query_stats['render_ms'], 0)
+
+    @override_settings(QUERY_BUDGETS={'polls:results': 1})
+    def test_over_budget_warns(self):
+        """A view over its budget is logged as a warning."""
+        with self.assertLogs('mysite.queries', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget is 1', logs.output[-1])
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_ACTION='raise')
+    def test_over_budget_fails(self):
+        """With the 'raise' action a view over budget fails the test."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_ACTION='raise',
+                       QUERY_BUDGETS={'polls:results': 100})
+    def test_view_budget(self):
+        """The budget of a view overrides the default one."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryInstrumentationOffTests(TestCase):
+
+    def test_off_by_default(self):
+        """Without QUERY_INSTRUMENTATION nothing is measured."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,154 @@
+import multiprocessing
+import multiprocessing.dummy
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from mysite.metrics import Counter, Histogram, Registry, registry
+
+from .base import create_question, create_choice
+
+
+def sample(name):
+    """Return the value of a sample of /metrics, 0 if not there."""
+    for line in registry.exposition().splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def count_in_child(directory):
+    with override_settings(METRICS_DIR=directory):
+        private = Registry()
+        Counter('test_total', 'Test.', registry=private).inc(2)
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        """Counters are shown by label with their help and type."""
+        counter = Counter('test_total', 'Test.', registry=self.registry)
+        counter.inc(kind='a')
+        counter.inc(3, kind='a')
+        counter.inc(kind='b')
+        self.assertEqual(self.registry.exposition(), (
+            '# HELP test_total Test.\n'
+            '# TYPE test_total counter\n'
+            'test_total{kind="a"} 4\n'
+            'test_total{kind="b"} 1\n'))
+
+    def test_histogram(self):
+        """Histogram buckets count every value up to their bound."""
+        histogram = Histogram('test_seconds', 'Test.', buckets=(0.1, 1.0),
+                              registry=self.registry)
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, view='v')
+        lines = self.registry.exposition().splitlines()[2:]
+        self.assertEqual(lines, [
+            'test_seconds_bucket{view="v",le="0.1"} 2',
+            'test_seconds_bucket{view="v",le="1.0"} 3',
+            'test_seconds_bucket{view="v",le="+Inf"} 4',
+            'test_seconds_sum{view="v"} 2.65',
+            'test_seconds_count{view="v"} 4',
+        ])
+
+    def test_threads_add_up(self):
+        """The values of every thread are shown added up."""
+        counter = Counter('test_total', 'Test.', registry=self.registry)
+        threads = [multiprocessing.dummy.Process(target=counter.inc)
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc()
+        self.assertIn('test_total 5', self.registry.exposition())
+
+    def test_one_store_per_process(self):
+        """Threads share the store, and the file, of their process."""
+        counter = Counter('test_total', 'Test.', registry=self.registry)
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            threads = [multiprocessing.dummy.Process(target=counter.inc)
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(os.listdir(directory), [f'{os.getpid()}.db'])
+            self.assertIn('test_total 8', self.registry.exposition())
+        self.assertEqual(len(self.registry._stores), 1)
+
+    def test_processes_add_up(self):
+        """With METRICS_DIR the values of every process are shown."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            counter = Counter('test_total', 'Test.', registry=self.registry)
+            counter.inc()
+            child = multiprocessing.get_context('fork').Process(
+                target=count_in_child, args=(directory,))
+            child.start()
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+            self.assertIn('test_total 3', self.registry.exposition())
+
+    def test_many_series(self):
+        """A store grows past its first size."""
+        counter = Counter('test_total', 'Test.', registry=self.registry)
+        for number in range(3000):
+            counter.inc(number=number)
+        lines = self.registry.exposition().splitlines()
+        self.assertEqual(len(lines), 3002)
+
+
+class MetricsViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='pw')
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+
+    def test_votes_by_outcome(self):
+        """New and changed votes are counted apart."""
+        new = sample('polls_votes_total{outcome="new"}')
+        changed = sample('polls_votes_total{outcome="changed"}')
+        self.client.login(username='a', password='pw')
+        url = reverse('polls:vote', args=(self.question.pk,))
+        self.client.post(url, {'choice': self.choice1.pk})
+        self.client.post(url, {'choice': self.choice2.pk})
+        self.assertEqual(sample('polls_votes_total{outcome="new"}'), new + 1)
+        self.assertEqual(sample('polls_votes_total{outcome="changed"}'),
+                         changed + 1)
+
+    def test_page_latency(self):
+        """The latency of the result page is recorded."""
+        name = 'polls_request_duration_seconds_count{view="polls:results"}'
+        before = sample(name)
+        self.client.get(reverse('polls:results', args=(self.question.pk,)))
+        self.assertEqual(sample(name), before + 1)
+
+    def test_login_failures(self):
+        """Refused logins are counted."""
+        before = sample('auth_login_failures_total')
+        self.client.post(reverse('login'),
+                         {'username': 'a', 'password': 'wrong'})
+        self.assertEqual(sample('auth_login_failures_total'), before + 1)
+
+    def test_endpoint(self):
+        """/metrics serves the text format to allowed addresses only."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE polls_votes_total counter',
+                      response.content.decode())
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,169 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from polls.cache import question_bundle, question_cache
+from polls.models import Choice, Vote
+from polls.tiered import TieredCache, is_process_local
+
+from .base import create_question, create_choice
+
+
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.loads = []
+
+    def load(self, value):
+        def load():
+            self.loads.append(value)
+            return value
+        return load
+
+    def test_read_through(self):
+        """A value is loaded once, then served from the local tier."""
+        tiers = TieredCache('test', size=2)
+        self.assertEqual(tiers.get('a', 1, self.load('A')), 'A')
+        self.assertEqual(tiers.get('a', 1, self.load('B')), 'A')
+        self.assertEqual(self.loads, ['A'])
+
+    def test_shared_tier(self):
+        """Another process finds the value in the shared cache."""
+        TieredCache('test', size=2).get('a', 1, self.load('A'))
+        other = TieredCache('test', size=2)
+        self.assertEqual(other.get('a', 1, self.load('B')), 'A')
+        self.assertEqual(self.loads, ['A'])
+
+    def test_new_version(self):
+        """A value of another version is never served."""
+        tiers = TieredCache('test', size=2)
+        tiers.get('a', 1, self.load('A'))
+        self.assertEqual(tiers.get('a', 2, self.load('B')), 'B')
+
+    def test_local_timeout(self):
+        """A value is read again from the shared tier once expired."""
+        tiers = TieredCache('test', size=2, timeout=60, local_timeout=5)
+        with mock.patch('time.monotonic', return_value=100):
+            tiers.get('a', 1, self.load('A'))
+        cache.set(tiers._shared_key('a', 1), 'B')
+        with mock.patch('time.monotonic', return_value=104):
+            self.assertEqual(tiers.get('a', 1, self.load('C')), 'A')
+        with mock.patch('time.monotonic', return_value=105):
+            self.assertEqual(tiers.get('a', 1, self.load('C')), 'B')
+        self.assertEqual(self.loads, ['A'])
+
+    def test_process_local_backend(self):
+        """
+        In a cache that is not shared, the versions of the other processes
+        are unknown, so values expire with the local ones.
+        """
+        tiers = TieredCache('test', size=2, timeout=60, local_timeout=5)
+        self.assertTrue(is_process_local(caches['default']))
+        self.assertEqual(tiers._shared_timeout(), 5)
+        with mock.patch('polls.tiered.is_process_local', return_value=False):
+            self.assertEqual(tiers._shared_timeout(), 60)
+
+    def test_eviction(self):
+        """The least recently used value leaves the local tier."""
+        tiers = TieredCache('test', size=2)
+        tiers.get('a', 1, self.load('A'))
+        tiers.get('b', 1, self.load('B'))
+        tiers.get('a', 1, self.load('A'))
+        tiers.get('c', 1, self.load('C'))
+        self.assertEqual(list(tiers._entries), ['a', 'c'])
+
+
+class QuestionBundleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        question_cache.clear()
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+
+    def test_cached_with_choices(self):
+        """The question and its choices are read once."""
+        with self.assertNumQueries(2):
+            question = question_bundle(self.question.pk)
+        with self.assertNumQueries(0):
+            question = question_bundle(self.question.pk)
+            self.assertEqual(list(question.choice_set.all()), [self.choice])
+
+    def test_missing_question(self):
+        """A question that does not exist is None."""
+        self.assertIsNone(question_bundle(0))
+
+    def test_choice_change(self):
+        """A new choice is seen at once."""
+        question_bundle(self.question.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_choice(self.question, 'choice 2')
+        question = question_bundle(self.question.pk)
+        self.assertEqual(len(question.choice_set.all()), 2)
+
+    def test_question_change(self):
+        """An edited question is seen at once."""
+        question_bundle(self.question.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.question_text = 'Edited.'
+            self.question.save()
+        self.assertEqual(question_bundle(self.question.pk).question_text,
+                         'Edited.')
+
+    def test_copies(self):
+        """Every caller gets its own instance, choices included."""
+        first = question_bundle(self.question.pk)
+        second = question_bundle(self.question.pk)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.choice_set.all()[0],
+                         second.choice_set.all()[0])
+        first.choice_set.all()[0].choice_text = 'Changed.'
+        self.assertEqual(question_bundle(self.question.pk)
+                         .choice_set.all()[0].choice_text, 'choice 1')
+
+    def test_vote_with_cached_question(self):
+        """Voting uses the cached choices and counts the vote."""
+        User.objects.create_user(username='a', password='pw')
+        self.client.login(username='a', password='pw')
+        url = reverse('polls:vote', args=(self.question.pk,))
+        question_bundle(self.question.pk)
+        response = self.client.post(url, {'choice': self.choice.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Vote.objects.get().choice, self.choice)
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.vote_count, 1)
+        response = self.client.post(url, {'choice': 'x'})
+        self.assertContains(response, "You didn&#x27;t select a choice!")
+
+
+class DeletedChoiceTests(TransactionTestCase):
+    # SQLite only checks foreign keys when the transaction commits
+
+    def setUp(self):
+        cache.clear()
+        question_cache.clear()
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+
+    def test_vote_for_deleted_choice(self):
+        """
+        A choice deleted by another process, still in the cached question
+        here, is refused instead of failing.
+        """
+        User.objects.create_user(username='a', password='pw')
+        self.client.login(username='a', password='pw')
+        question_bundle(self.question.pk)
+        # the other process does not bump the versions of this one
+        with mock.patch('polls.signals.invalidate_questions'):
+            Choice.objects.filter(pk=self.choice.pk).delete()
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.pk,)),
+            {'choice': self.choice.pk})
+        self.assertRedirects(response, reverse('polls:detail',
+                                               args=(self.question.pk,)),
+                             fetch_redirect_response=False)
+        self.assertFalse(Vote.objects.exists())
@@ -1,7 +1,15 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Vote
+from polls.services import question_results
 
-from .base import create_question
+from .base import create_question, create_choice
 
 
 class QuestionResultsViewTests(TestCase):
@@ -14,3 +22,105 @@ class QuestionResultsViewTests(TestCase):
         url = reverse('polls:results', args=(question.id, ))
         response = self.client.get(url)
         self.assertEqual(response.status_code, 302)
+
+    def test_results_query_count_is_constant(self):
+        """
+        The results page runs the same number of queries however many
+        choices the question has.
+        """
+        for count in (2, 10):
+            question = create_question(question_text='Test.', days=-1)
+            for i in range(count):
+                create_choice(question, f'choice {i}')
+            url = reverse('polls:results', args=(question.id, ))
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(len(response.context['results'].choices), count)
+
+
+class QuestionResultsCachingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Test.', days=-1)
+        self.choice = create_choice(self.question, 'choice 1')
+        self.url = reverse('polls:results', args=(self.question.id, ))
+
+    def test_live_question(self):
+        """The results of a live question are cached only briefly."""
+        response = self.client.get(self.url)
+        self.assertIn('max-age=5', response['Cache-Control'])
+        self.assertIn('stale-while-revalidate=30', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_ended_question(self):
+        """The results of an ended question are cached for long."""
+        self.question.end_date = timezone.localtime() \
+            - datetime.timedelta(days=1)
+        self.question.save()
+        response = self.client.get(self.url)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+    def test_not_modified_before_counting(self):
+        """A 304 is answered without counting the votes."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_vote_changes_etag(self):
+        """A committed vote makes the cached page stale."""
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user(username='a')
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(user=user, choice=self.choice)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_changes_etag(self):
+        """The navigation bar differs once logged in."""
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user(username='a')
+        self.client.force_login(user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_message_is_private(self):
+        """A page showing a message for the user is not shared."""
+        user = User.objects.create_user(username='a', password='pw')
+        self.client.login(username='a', password='pw')
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.id, )),
+            {'choice': self.choice.id}, follow=True)
+        self.assertContains(response, 'choice 1')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+        self.assertTrue(user.vote_set.exists())
+
+
+class QuestionResultsServiceTests(TestCase):
+
+    def test_counts_and_percentages(self):
+        """question_results() returns counts, percentages and the total."""
+        question = create_question(question_text='Test.', days=-1)
+        choice1 = create_choice(question, 'choice 1')
+        create_choice(question, 'choice 2')
+        for name in ('a', 'b', 'c', 'd'):
+            user = User.objects.create_user(username=name)
+            Vote.objects.create(user=user, choice=choice1)
+        with self.assertNumQueries(1):
+            results = question_results(question)
+        self.assertEqual(results.total, 4)
+        self.assertEqual([c.votes for c in results.choices], [4, 0])
+        self.assertEqual([c.percentage for c in results.choices],
+                         [100.0, 0.0])
+
+    def test_no_choices(self):
+        """A question without choices has a total of zero."""
+        question = create_question(question_text='Test.', days=-1)
+        results = question_results(question)
+        self.assertEqual(results.choices, [])
+        self.assertEqual(results.total, 0)
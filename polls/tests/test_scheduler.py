@@ -0,0 +1,156 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import index_version
+from polls.models import ResultSnapshot
+from polls.scheduler import (CLOSE, PUBLISH, QuestionScheduler, Transition,
+                             question_closed, scheduler)
+
+from .base import create_question
+
+
+class QuestionSchedulerTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.fired = []
+        self.scheduler = QuestionScheduler()
+        self.scheduler.on(PUBLISH, self.fired.append)
+        self.scheduler.on(CLOSE, self.fired.append)
+
+    def later(self, **kwargs):
+        return self.now + datetime.timedelta(**kwargs)
+
+    def test_next_transition(self):
+        """The soonest publish or close transition comes first."""
+        future = create_question(question_text='Future.', days=2)
+        live = create_question(question_text='Live.', days=-1)
+        live.end_date = self.later(days=1)
+        live.save()
+        self.assertEqual(self.scheduler.next_transition(self.now),
+                         Transition(live.end_date, live.pk, CLOSE))
+        self.assertEqual(self.scheduler.next_transition(self.later(hours=36)),
+                         Transition(future.pub_date, future.pk, PUBLISH))
+        self.assertIsNone(self.scheduler.next_transition(self.later(days=3)))
+
+    def test_hooks_run_once(self):
+        """The hooks of a due transition run once."""
+        future = create_question(question_text='Future.', days=1)
+        self.assertEqual(self.scheduler.run_due(self.now), [])
+        due = self.scheduler.run_due(self.later(days=2))
+        self.assertEqual(due, [Transition(future.pub_date, future.pk,
+                                          PUBLISH)])
+        self.assertEqual(self.fired, due)
+        self.assertEqual(self.scheduler.run_due(self.later(days=3)), [])
+
+    def test_change_reloads(self):
+        """
+        A changed question is picked up, and transitions that passed
+        since the last run still fire.
+        """
+        self.scheduler.run_due(self.now)
+        with self.captureOnCommitCallbacks(execute=True):
+            question = create_question(question_text='Live.', days=-1)
+            question.end_date = self.later(hours=1)
+            question.save()
+        due = self.scheduler.run_due(self.later(hours=2))
+        self.assertEqual(due, [Transition(question.end_date, question.pk,
+                                          CLOSE)])
+
+    def test_change_seen_once_committed(self):
+        """
+        The index stamp changes when the edit commits, not before, so that
+        the scheduler never reloads the rows of before the edit for good.
+        """
+        self.scheduler.run_due(self.now)
+        version = index_version()
+        with mock.patch.object(scheduler, 'changed') as changed:
+            with self.captureOnCommitCallbacks() as callbacks:
+                question = create_question(question_text='Live.', days=-1)
+                question.end_date = self.later(hours=1)
+                question.save()
+            self.assertEqual(index_version(), version)
+            changed.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertNotEqual(index_version(), version)
+        changed.assert_called()
+        due = self.scheduler.run_due(self.later(hours=2))
+        self.assertEqual(due, [Transition(question.end_date, question.pk,
+                                          CLOSE)])
+
+    @override_settings(POLLS_SCHEDULER_INTERVAL=60)
+    @mock.patch('polls.scheduler.index_version', return_value=1)
+    def test_change_of_another_process(self, index_version):
+        """
+        A question changed by a process that does not share the index
+        stamp is picked up after POLLS_SCHEDULER_INTERVAL.
+        """
+        with mock.patch('polls.scheduler.time.monotonic', return_value=0):
+            self.assertEqual(self.scheduler.active_questions(self.now),
+                             frozenset())
+        question = create_question(question_text='Live.', days=-1)
+        with mock.patch('polls.scheduler.time.monotonic', return_value=1):
+            self.assertEqual(self.scheduler.active_questions(self.now),
+                             frozenset())
+        with mock.patch('polls.scheduler.time.monotonic', return_value=60):
+            self.assertEqual(self.scheduler.active_questions(self.now),
+                             {question.pk})
+
+    def test_active_questions(self):
+        """Open questions are active until their transition."""
+        live = create_question(question_text='Live.', days=-1)
+        live.end_date = self.later(days=1)
+        live.save()
+        create_question(question_text='Future.', days=1)
+        ended = create_question(question_text='Ended.', days=-2)
+        ended.end_date = self.later(days=-1)
+        ended.save()
+        self.assertEqual(self.scheduler.active_questions(self.now),
+                         {live.pk})
+        self.assertEqual(len(self.scheduler.active_questions(
+            self.later(hours=30))), 1)
+
+    def test_close_freezes_results(self):
+        """The default close hook stores a result snapshot."""
+        question = create_question(question_text='Ended.', days=-2)
+        question.end_date = self.later(seconds=-1)
+        question.save()
+        question_closed(Transition(question.end_date, question.pk, CLOSE))
+        self.assertTrue(ResultSnapshot.objects.filter(
+            question=question).exists())
+
+    def test_thread(self):
+        """The background thread starts and stops."""
+        self.scheduler.start()
+        self.scheduler.stop()
+        self.assertIsNone(self.scheduler._thread)
+
+
+class IndexScheduleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_vote_button_of_open_questions(self):
+        """Closed questions are listed without a vote button."""
+        live = create_question(question_text='Live.', days=-1)
+        ended = create_question(question_text='Ended.', days=-2)
+        ended.end_date = timezone.now() - datetime.timedelta(days=1)
+        ended.save()
+        for name in ('polls:index', 'polls:all'):
+            response = self.client.get(reverse(name))
+            content = b''.join(response) if response.streaming \
+                else response.content
+            detail = 'href="{}"'.format
+            self.assertIn(detail(reverse('polls:detail', args=(live.pk,))),
+                          content.decode())
+            self.assertNotIn(detail(reverse('polls:detail',
+                                            args=(ended.pk,))),
+                             content.decode())
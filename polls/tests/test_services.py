@@ -0,0 +1,68 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from polls.models import Choice, Vote
+from polls.services import cast_vote
+
+from .base import create_question, create_choice
+
+
+class CastVoteTests(TestCase):
+
+    def setUp(self):
+        """Set up a user, a question and two choices."""
+        self.user = User.objects.create_user(username='test_user')
+        self.question = create_question(question_text='test', days=-1)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+
+    def test_new_changed_and_unchanged(self):
+        """cast_vote() reports whether the vote was new or changed."""
+        outcome = cast_vote(self.user, self.choice1)
+        self.assertEqual((outcome.created, outcome.changed), (True, True))
+        outcome = cast_vote(self.user, self.choice2)
+        self.assertEqual((outcome.created, outcome.changed), (False, True))
+        self.assertEqual(outcome.previous_choice_id, self.choice1.pk)
+        outcome = cast_vote(self.user, self.choice2)
+        self.assertEqual((outcome.created, outcome.changed), (False, False))
+        self.assertEqual(Vote.objects.get().choice, self.choice2)
+
+
+class ConcurrentCastVoteTests(TransactionTestCase):
+
+    def test_concurrent_votes_leave_one_row(self):
+        """
+        Many threads voting for the same user and question at once leave
+        exactly one vote and consistent counters.
+        """
+        user = User.objects.create_user(username='test_user')
+        question = create_question(question_text='test', days=-1)
+        choices = [create_choice(question, f'choice {i}') for i in range(3)]
+        errors = []
+        start = threading.Barrier(8)
+
+        def voter(number):
+            try:
+                start.wait()
+                for i in range(10):
+                    cast_vote(user, choices[(number + i) % len(choices)])
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=voter, args=(number,))
+                   for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(Vote.objects.filter(user=user).count(), 1)
+        vote = Vote.objects.get(user=user)
+        counts = dict(Choice.objects.values_list('pk', 'vote_count'))
+        self.assertEqual(sum(counts.values()), 1)
+        self.assertEqual(counts[vote.choice_id], 1)
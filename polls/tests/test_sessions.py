@@ -0,0 +1,124 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from mysite.checks import check_shared_cache
+
+from .base import create_question, create_choice
+
+
+def tables_read(client, url):
+    """Return the SQL of the queries run to answer a GET of `url`."""
+    with CaptureQueriesContext(connection) as captured:
+        client.get(url)
+    return ' '.join(query['sql'] for query in captured)
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=60)
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='pw')
+        self.question = create_question(question_text='Test.', days=-1)
+        create_choice(self.question, 'choice 1')
+        self.url = reverse('polls:detail', args=(self.question.pk,))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='a', password='pw')
+
+    def test_user_from_cache(self):
+        """After the first request the user is not read again."""
+        self.assertIn('auth_user', tables_read(self.client, self.url))
+        self.assertNotIn('auth_user', tables_read(self.client, self.url))
+
+    def test_deactivated_user(self):
+        """A deactivated user is logged out at the next request."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('login'),
+                             fetch_redirect_response=False)
+
+    def test_changed_password(self):
+        """Changing the password logs out the other sessions."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new')
+            self.user.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('login'),
+                             fetch_redirect_response=False)
+
+
+class SessionProfileTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='a', password='pw')
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        AUTH_USER_CACHE_TIMEOUT=60)
+    def test_signed_cookies(self):
+        """Signed cookie sessions and a cached user need no query."""
+        url = reverse('polls:index')
+        self.client.login(username='a', password='pw')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Welcome back')
+
+
+class PurgeSessionsTests(TestCase):
+
+    def test_purge_expired(self):
+        """Only expired sessions are deleted, in batches."""
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(session_key=f'old{number}',
+                                   session_data='',
+                                   expire_date=now
+                                   - datetime.timedelta(days=1))
+        Session.objects.create(session_key='new', session_data='',
+                               expire_date=now + datetime.timedelta(days=1))
+        out = StringIO()
+        call_command('purge_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertIn('Deleted 5', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key',
+                                                          flat=True)),
+                         ['new'])
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def check_ids(self):
+        return [error.id for error in check_shared_cache(None)]
+
+    @override_settings(SESSION_PROFILE='cached_db', AUTH_USER_CACHE_TIMEOUT=60)
+    def test_local_cache_refused(self):
+        """Sessions and users in a per process cache are errors."""
+        self.assertEqual(self.check_ids(), ['mysite.E001', 'mysite.E002'])
+
+    @override_settings(SESSION_PROFILE='database', AUTH_USER_CACHE_TIMEOUT=0)
+    def test_database_sessions_allowed(self):
+        """Sessions and users read from the database need no cache."""
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(
+        SESSION_PROFILE='cached_db', AUTH_USER_CACHE_TIMEOUT=60,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/ku-polls-check-cache'}})
+    def test_shared_cache_allowed(self):
+        """A cache shared by the processes takes both."""
+        self.assertEqual(self.check_ids(), [])
@@ -0,0 +1,144 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from mysite.ratelimit import FixedWindow, client_address
+
+SIGNUP = {'username': 'new', 'password1': 'correct-horse-42',
+          'password2': 'correct-horse-42'}
+
+
+class SignupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hashes_once(self):
+        """The new user is logged in without hashing the password again."""
+        encode = PBKDF2PasswordHasher.encode
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode',
+                               autospec=True,
+                               side_effect=encode) as encoded:
+            response = self.client.post(reverse('signup'), SIGNUP)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(encoded.call_count, 1)
+        self.assertEqual(int(self.client.session['_auth_user_id']),
+                         User.objects.get(username='new').pk)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_configured_iterations(self):
+        """New hashes use the configured number of iterations."""
+        self.assertTrue(make_password('secret')
+                        .startswith('pbkdf2_sha256$1000$'))
+
+
+@override_settings(AUTH_RATE_LIMIT_BURST=2, AUTH_RATE_LIMIT_PER_MINUTE=1)
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_signup_limited(self):
+        """A client over its burst is told to come back later."""
+        with mock.patch('mysite.ratelimit.time.time', return_value=150):
+            for _ in range(2):
+                self.client.post(reverse('signup'), {'username': ''})
+            response = self.client.post(reverse('signup'), SIGNUP)
+        self.assertEqual(response.status_code, 429)
+        # the window of 2 attempts at 1 a minute ends at 240
+        self.assertEqual(response['Retry-After'], '90')
+        self.assertFalse(User.objects.exists())
+
+    def test_login_limited(self):
+        """Logins are limited apart from signups, by client address."""
+        data = {'username': 'a', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post(reverse('login'), data)
+        self.assertEqual(self.client.post(reverse('login'), data)
+                         .status_code, 429)
+        response = self.client.post(reverse('login'), data,
+                                    REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(reverse('signup'), {})
+                         .status_code, 200)
+
+    def test_pages_not_limited(self):
+        """Showing the forms takes no token."""
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('login')).status_code,
+                             200)
+
+
+class FixedWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def take(self, window, now):
+        with mock.patch('mysite.ratelimit.time.time', return_value=now):
+            return window.take('client')
+
+    def test_window(self):
+        """Attempts past the limit wait for the end of their window."""
+        window = FixedWindow('test', limit=2, per_second=0.5)
+        self.assertEqual(self.take(window, 0), 0)
+        self.assertEqual(self.take(window, 1), 0)
+        self.assertEqual(self.take(window, 1), 3)
+        self.assertEqual(self.take(window, 4), 0)
+
+    def test_no_refill(self):
+        """Without a rate, attempts past the limit wait for ever."""
+        window = FixedWindow('test', limit=1, per_second=0)
+        self.assertEqual(self.take(window, 0), 0)
+        self.assertEqual(self.take(window, 10 ** 6), float('inf'))
+
+    def test_atomic(self):
+        """Every attempt is counted, even when the counter goes meanwhile."""
+        window = FixedWindow('test', limit=5, per_second=1)
+        incr = cache.incr
+
+        def expire_first(key, *args):
+            # the counter expires between add() and the first incr()
+            if not expire_first.done:
+                expire_first.done = True
+                cache.delete(key)
+            return incr(key, *args)
+        expire_first.done = False
+        with mock.patch.object(cache, 'incr', expire_first):
+            self.assertEqual(self.take(window, 0), 0)
+        with mock.patch('mysite.ratelimit.time.time', return_value=0):
+            self.assertEqual(cache.get('ratelimit:test:client:0'), 1)
+
+    async def test_async(self):
+        """atake() counts in the same counters."""
+        window = FixedWindow('test', limit=1, per_second=1)
+        with mock.patch('mysite.ratelimit.time.time', return_value=0.5):
+            self.assertEqual(await window.atake('client'), 0)
+            self.assertEqual(await window.atake('client'), 0.5)
+
+
+class ClientAddressTests(SimpleTestCase):
+
+    def address(self, **meta):
+        return client_address(RequestFactory().post('/', **meta))
+
+    def test_remote_addr(self):
+        """By default, the client is the address of the connection."""
+        self.assertEqual(self.address(REMOTE_ADDR='10.0.0.1',
+                                      HTTP_X_FORWARDED_FOR='1.2.3.4'),
+                         '10.0.0.1')
+
+    @override_settings(AUTH_RATE_LIMIT_CLIENT_HEADER='HTTP_X_FORWARDED_FOR',
+                       AUTH_RATE_LIMIT_TRUSTED_PROXIES=2)
+    def test_forwarded_for(self):
+        """Addresses the client put in front of the proxies' are ignored."""
+        self.assertEqual(self.address(
+            HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4, 10.0.0.2'), '1.2.3.4')
+        self.assertEqual(self.address(HTTP_X_FORWARDED_FOR='1.2.3.4'),
+                         '1.2.3.4')
+        self.assertEqual(self.address(REMOTE_ADDR='10.0.0.1'), '10.0.0.1')
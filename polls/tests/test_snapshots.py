@@ -0,0 +1,91 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import ResultSnapshot, Vote
+from polls.services import freeze_results
+
+from .base import create_question, create_choice
+
+
+class ResultSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Test.', days=-2)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+        for name in ('a', 'b', 'c'):
+            user = User.objects.create_user(username=name)
+            Vote.objects.create(user=user, choice=self.choice1)
+        self.question.end_date = timezone.localtime() \
+            - datetime.timedelta(days=1)
+        self.question.save()
+
+    def test_freeze_ended_questions(self):
+        """Only ended questions without a snapshot are frozen."""
+        create_question(question_text='Live.', days=-1)
+        self.assertEqual(freeze_results(), 1)
+        snapshot = ResultSnapshot.objects.get()
+        self.assertEqual(snapshot.total, 3)
+        self.assertEqual(snapshot.choices,
+                         [[self.choice1.pk, 'choice 1', 3],
+                          [self.choice2.pk, 'choice 2', 0]])
+        self.assertEqual(freeze_results(), 0)
+
+    def test_results_page_uses_snapshot(self):
+        """The results of a frozen question are served in one query."""
+        freeze_results()
+        url = reverse('polls:results', args=(self.question.id, ))
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        results = response.context['results']
+        self.assertEqual(results.total, 3)
+        self.assertEqual([c.percentage for c in results.choices],
+                         [100.0, 0.0])
+
+    def test_api_uses_snapshot(self):
+        """The results API serves the snapshot too."""
+        freeze_results()
+        url = reverse('polls:api_results', args=(self.question.id, ))
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['total'], 3)
+
+    def test_reopen_drops_snapshot(self):
+        """Moving the end date drops the snapshot."""
+        freeze_results()
+        self.question.end_date = None
+        self.question.save()
+        self.assertFalse(ResultSnapshot.objects.exists())
+
+    def test_choice_change_drops_snapshot(self):
+        """Editing a choice drops the snapshot that holds its text."""
+        freeze_results()
+        self.choice2.choice_text = 'renamed'
+        self.choice2.save()
+        self.assertFalse(ResultSnapshot.objects.exists())
+
+    def test_no_vote_after_end(self):
+        """Votes on an ended question are refused."""
+        User.objects.create_user(username='d', password='pw')
+        self.client.login(username='d', password='pw')
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.id, )),
+            {'choice': self.choice2.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Vote.objects.count(), 3)
+
+    def test_command(self):
+        """freeze_results freezes the given questions."""
+        call_command('freeze_results', questions=[self.question.pk + 1],
+                     stdout=StringIO())
+        self.assertFalse(ResultSnapshot.objects.exists())
+        call_command('freeze_results', stdout=StringIO())
+        self.assertTrue(ResultSnapshot.objects.exists())
@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from polls.models import Choice, Question, Vote
+from polls.transfer import import_records, iter_json_array, sources_of
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+def run(*args, **options):
+    return call_command(*args, stdout=io.StringIO(), stderr=io.StringIO(),
+                        **options)
+
+
+class TransferTests(TestCase):
+
+    def test_incremental_json_array(self):
+        """Fixtures parsed piece by piece match the whole file."""
+        path = os.path.join(DATA, 'polls.json')
+        with open(path) as file:
+            expected = json.load(file)
+        with open(path) as file:
+            self.assertEqual(list(iter_json_array(file, chunk_size=7)),
+                             expected)
+
+    def test_import_fixtures(self):
+        """The shipped fixtures import, votes get their question."""
+        run('import_polls', os.path.join(DATA, 'users.json'),
+            os.path.join(DATA, 'polls.json'), batch_size=10)
+        self.assertTrue(User.objects.exists())
+        vote = Vote.objects.first()
+        self.assertEqual(vote.question_id, vote.choice.question_id)
+        run('recount_votes', check=True)
+
+    def test_loaddata_fixtures(self):
+        """The shipped fixtures also load with loaddata, votes included."""
+        run('loaddata', os.path.join(DATA, 'users.json'),
+            os.path.join(DATA, 'polls.json'))
+        self.assertTrue(Vote.objects.exists())
+        run('recount_votes')
+        run('recount_votes', check=True)
+
+    def round_trip(self, format):
+        run('import_polls', os.path.join(DATA, 'users.json'),
+            os.path.join(DATA, 'polls.json'))
+        before = list(Vote.objects.values_list('pk', 'user', 'choice',
+                                               'question'))
+        fields = [field.name for field in Question._meta.concrete_fields
+                  if field.name != 'results_version']
+        questions = list(Question.objects.values_list(*fields))
+        versions = dict(Question.objects.values_list('pk', 'results_version'))
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'polls.jsonl') \
+                if format == 'jsonl' else directory
+            run('export_polls', output, format=format)
+            User.objects.all().delete()
+            Question.objects.all().delete()
+            run('import_polls', output, batch_size=7)
+        self.assertEqual(list(Vote.objects.values_list(
+            'pk', 'user', 'choice', 'question')), before)
+        self.assertEqual(list(Question.objects.values_list(*fields)),
+                         questions)
+        # the results of the imported questions have a new version
+        for pk, version in Question.objects.values_list('pk',
+                                                        'results_version'):
+            self.assertGreater(version, versions[pk])
+        run('recount_votes', check=True)
+
+    def test_jsonl_round_trip(self):
+        """An export in JSON Lines imports back as it was."""
+        self.round_trip('jsonl')
+
+    def test_csv_round_trip(self):
+        """An export in CSV imports back as it was."""
+        self.round_trip('csv')
+
+    def test_resume(self):
+        """An import with a state file skips what was already written."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(DATA, 'polls-question.json')
+            state = os.path.join(directory, 'state.json')
+            with open(state, 'w') as file:
+                json.dump({path: 2}, file)
+            run('import_polls', path, state=state)
+            with open(path) as file:
+                total = len(json.load(file))
+            self.assertEqual(Question.objects.count(), total - 2)
+            with open(state) as file:
+                self.assertEqual(json.load(file), {path: total})
+
+
+    def import_jsonl(self, records):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'polls.jsonl')
+            with open(path, 'w') as file:
+                for model, pk, fields in records:
+                    file.write(json.dumps({'model': model, 'pk': pk,
+                                           'fields': fields}) + '\n')
+            return import_records(sources_of(path), batch_size=2)
+
+    def poll_records(self):
+        return [
+            ('auth.user', 1, {'username': 'voter', 'password': ''}),
+            ('polls.question', 1, {'question_text': 'Which?',
+                                   'pub_date': '2023-01-01T00:00:00Z'}),
+            ('polls.choice', 1, {'question': 1, 'choice_text': 'a'}),
+            ('polls.choice', 2, {'question': 1, 'choice_text': 'b'}),
+        ]
+
+    def test_latest_duplicate_vote_is_kept(self):
+        """Like migration 0012, the vote with the highest pk is kept."""
+        self.import_jsonl(self.poll_records() + [
+            ('polls.vote', 5, {'user': 1, 'choice': 2}),
+            ('polls.vote', 3, {'user': 1, 'choice': 1}),
+            # in a later batch than the vote it replaces
+            ('polls.vote', 7, {'user': 1, 'choice': 1}),
+        ])
+        self.assertEqual(list(Vote.objects.values_list('pk', 'choice')),
+                         [(7, 1)])
+        run('recount_votes', check=True)
+
+    def test_only_written_rows_are_counted(self):
+        """Rows already stored or clashing on a unique field are skipped."""
+        User.objects.create_user(username='taken')
+        self.import_jsonl(self.poll_records())
+        counts = self.import_jsonl(self.poll_records() + [
+            ('auth.user', 2, {'username': 'taken', 'password': ''}),
+            ('polls.choice', 3, {'question': 1, 'choice_text': 'c'}),
+        ])
+        self.assertEqual(counts, {'auth.user': 0, 'polls.question': 0,
+                                  'polls.choice': 1, 'polls.vote': 0})
+
+    def test_sequences_are_reset(self):
+        """Rows created after an import do not reuse imported pks."""
+        records = self.poll_records()
+        records[1] = ('polls.question', 100, records[1][2])
+        self.import_jsonl(records[:2])
+        question = Question.objects.create(question_text='New',
+                                           pub_date='2023-01-02T00:00:00Z')
+        self.assertGreater(question.pk, 100)
+
+
+class DeferredIndexTests(TransactionTestCase):
+
+    def test_indexes_are_rebuilt(self):
+        """The dropped indexes exist again after the import."""
+        run('import_polls', os.path.join(DATA, 'polls-question.json'),
+            os.path.join(DATA, 'polls-choice.json'), defer_indexes=True)
+        self.assertTrue(Choice.objects.exists())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Question._meta.db_table)
+        self.assertIn('polls_question_pub_id_idx', constraints)
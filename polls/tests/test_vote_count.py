@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, Vote
+
+from .base import create_question, create_choice
+
+
+class VoteCountTests(TestCase):
+
+    def setUp(self):
+        """Set up a user, a question and two choices."""
+        self.user = User.objects.create_user(username='test_user',
+                                             password='secret')
+        self.question = create_question(question_text='test', days=-1)
+        self.choice1 = create_choice(self.question, 'choice 1')
+        self.choice2 = create_choice(self.question, 'choice 2')
+
+    def assertVotes(self, choice, count):
+        """Assert the stored counter of `choice`."""
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, count)
+
+    def test_new_vote_is_counted(self):
+        """Voting adds one to the selected choice."""
+        self.client.login(username='test_user', password='secret')
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice1.id})
+        self.assertVotes(self.choice1, 1)
+        self.assertVotes(self.choice2, 0)
+
+    def test_switched_vote_moves_count(self):
+        """Changing a vote moves the count to the new choice."""
+        self.client.login(username='test_user', password='secret')
+        url = reverse('polls:vote', args=(self.question.id,))
+        self.client.post(url, {'choice': self.choice1.id})
+        self.client.post(url, {'choice': self.choice2.id})
+        self.assertVotes(self.choice1, 0)
+        self.assertVotes(self.choice2, 1)
+
+    def test_deleted_vote_is_uncounted(self):
+        """Deleting a vote, also through its user, takes it off."""
+        Vote.objects.create(user=self.user, choice=self.choice1)
+        other = User.objects.create_user(username='other')
+        Vote.objects.create(user=other, choice=self.choice1)
+        self.assertVotes(self.choice1, 2)
+        other.delete()
+        self.assertVotes(self.choice1, 1)
+        Vote.objects.get(user=self.user).delete()
+        self.assertVotes(self.choice1, 0)
+
+    def test_recount_votes_command(self):
+        """recount_votes --check detects drift and recount_votes fixes it."""
+        Vote.objects.create(user=self.user, choice=self.choice1)
+        Choice.objects.filter(pk=self.choice1.pk).update(vote_count=5)
+        with self.assertRaises(CommandError):
+            call_command('recount_votes', check=True, stdout=StringIO())
+        call_command('recount_votes', stdout=StringIO())
+        self.assertVotes(self.choice1, 1)
+        call_command('recount_votes', check=True, stdout=StringIO())
@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.urls import reverse
 
@@ -58,3 +59,19 @@ class VoteModelTests(TestCase):
         )
         self.assertEqual(Vote.objects.all().count(), 1)
         self.assertEqual(response.status_code, 302)
+
+    def test_vote_question_follows_choice(self):
+        """A vote is stored with the question of its choice."""
+        question = create_question(question_text='test', days=-1)
+        choice = create_choice(question=question, choice_text='choice 1')
+        vote = Vote.objects.create(user=self.user, choice=choice)
+        self.assertEqual(vote.question, question)
+
+    def test_duplicate_vote_is_rejected(self):
+        """The database refuses a second vote of a user for a question."""
+        question = create_question(question_text='test', days=-1)
+        choice1 = create_choice(question=question, choice_text='choice 1')
+        choice2 = create_choice(question=question, choice_text='choice 2')
+        Vote.objects.create(user=self.user, choice=choice1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(user=self.user, choice=choice2)
@@ -0,0 +1,130 @@
+"""
+A read-through cache in two tiers: a bounded LRU in every process in
+front of the shared Django cache.
+
+Values are stored under a version stamp that the caller reads first
+(see polls.cache), so that a new stamp makes both tiers miss; entries
+of older stamps fall out of the LRU and expire from the shared cache.
+The stamps are only shared by the processes when the cache backend is:
+a LocMemCache keeps those of its process, which never sees the changes
+made by the others. Values then live for `local_timeout` seconds in
+both tiers, which bounds how long a stale one is served. Lookups and
+evictions are counted in polls_cache_requests_total and
+polls_cache_evictions_total.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from mysite.metrics import CACHE_EVICTIONS, CACHE_REQUESTS
+
+_MISSING = object()
+
+
+def is_process_local(backend):
+    """Return whether the values of the cache `backend` are per process."""
+    return isinstance(backend, LocMemCache)
+
+
+def bounded_timeout(timeout, local_timeout):
+    """
+    Return the timeout of a value of the default cache: `timeout`, or no
+    more than `local_timeout` when the cache is per process, where the
+    value is not dropped when another process changes it.
+    """
+    if not is_process_local(caches['default']):
+        return timeout
+    if timeout is None:
+        return local_timeout
+    return min(timeout, local_timeout)
+
+
+class TieredCache:
+    """
+    Up to `size` values in this process for `local_timeout` seconds, all
+    in the shared cache for `timeout` seconds.
+    """
+
+    def __init__(self, name, size, timeout=None, local_timeout=5):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version \
+                    or entry[2] <= time.monotonic():
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, key, version, value):
+        evicted = 0
+        expires = time.monotonic() + self.local_timeout
+        with self._lock:
+            self._entries[key] = (version, value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            CACHE_EVICTIONS.inc(evicted, cache=self.name)
+
+    def _count(self, tier, result):
+        CACHE_REQUESTS.inc(cache=self.name, tier=tier, result=result)
+
+    def _shared_key(self, key, version):
+        return f'{self.name}:{key}:{version}'
+
+    def _shared_timeout(self):
+        return bounded_timeout(self.timeout, self.local_timeout)
+
+    def get(self, key, version, load):
+        """
+        Return the value of `key` at `version`, calling load() to read it
+        when neither tier has it.
+        """
+        value = self._local(key, version)
+        if value is not _MISSING:
+            self._count('local', 'hit')
+            return value
+        self._count('local', 'miss')
+        shared_key = self._shared_key(key, version)
+        value = cache.get(shared_key, _MISSING)
+        if value is _MISSING:
+            self._count('shared', 'miss')
+            value = load()
+            cache.set(shared_key, value, self._shared_timeout())
+        else:
+            self._count('shared', 'hit')
+        self._remember(key, version, value)
+        return value
+
+    async def aget(self, key, version, aload):
+        """Async version of get(), `aload` is a coroutine function."""
+        value = self._local(key, version)
+        if value is not _MISSING:
+            self._count('local', 'hit')
+            return value
+        self._count('local', 'miss')
+        shared_key = self._shared_key(key, version)
+        value = await cache.aget(shared_key, _MISSING)
+        if value is _MISSING:
+            self._count('shared', 'miss')
+            value = await aload()
+            await cache.aset(shared_key, value, self._shared_timeout())
+        else:
+            self._count('shared', 'hit')
+        self._remember(key, version, value)
+        return value
+
+    def clear(self):
+        """Forget the values kept in this process."""
+        with self._lock:
+            self._entries.clear()
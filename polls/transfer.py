@@ -0,0 +1,415 @@
+"""
+Streamed import and export of users, questions, choices and votes.
+
+Records have the shape of the objects of a Django fixture,
+{"model": "polls.question", "pk": 1, "fields": {...}}, and are read and
+written one at a time, so that neither side ever holds a whole data set:
+
+* JSON Lines: one record per line, every model in one file.
+* CSV: one `<model>.csv` file per model in a directory, with a `pk`
+  column and one column per field.
+* JSON fixtures (the files of data/): a JSON array parsed incrementally.
+
+The importer writes the records with bulk_create() in batches, each batch
+in its own transaction, and can record after each batch how many records
+of every source are written, so that an interrupted import resumes where
+it stopped. Votes of older fixtures without a question get the question
+of their choice, and only the latest vote of a user for a question is
+kept, as in migration 0012. Bulk inserts send no signals: the vote
+counters are rebuilt, result snapshots dropped, caches invalidated and
+the sequences of the primary keys reset at the end.
+"""
+import csv
+import json
+import os
+from contextlib import contextmanager, nullcontext
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+
+from .cache import (invalidate_index, invalidate_questions,
+                    invalidate_results, invalidate_user_votes)
+from .models import Choice, ResultSnapshot, Vote
+
+# in the order they must be written, so that references resolve
+MODELS = ['auth.user', 'polls.question', 'polls.choice', 'polls.vote']
+
+
+class TransferError(ValueError):
+    """Raised when a record cannot be imported."""
+
+
+def fields_of(model):
+    """Return the fields of `model` that are imported and exported."""
+    return [field for field in model._meta.concrete_fields
+            if not field.primary_key]
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """Yield the values of the JSON array read from `stream` one by one."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    expect = '['
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+        if position == len(buffer):
+            raise TransferError('The JSON array is not closed.')
+        char = buffer[position]
+        if expect == '[':
+            if char != '[':
+                raise TransferError('A JSON fixture must be an array.')
+            position += 1
+            expect = 'value or ]'
+            continue
+        if char == ']' and expect != 'value':
+            return
+        if expect == ', or ]':
+            if char != ',':
+                raise TransferError(
+                    f'Unexpected {char!r} in the JSON array.')
+            position += 1
+            expect = 'value'
+            continue
+        while True:
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                # the value goes on in the next chunk
+                if eof:
+                    raise
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+        yield value
+        expect = ', or ]'
+
+
+def iter_jsonl(stream):
+    """Yield the records of a JSON Lines stream."""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream, label):
+    """Yield the records of model `label` from a CSV stream."""
+    model = apps.get_model(label)
+    nullable = {field.name for field in fields_of(model) if field.null}
+    for row in csv.DictReader(stream):
+        pk = row.pop('pk')
+        # CSV has no null, an empty cell of a nullable field stands for it
+        fields = {name: None if value == '' and name in nullable else value
+                  for name, value in row.items()}
+        yield {'model': label, 'pk': pk, 'fields': fields}
+
+
+def sources_of(path, format=None):
+    """
+    Return the (name, open function) pairs of the sources of `path`: a
+    file, or a directory of CSV files named after their model.
+    """
+    if os.path.isdir(path):
+        sources = []
+        for label in MODELS:
+            file_path = os.path.join(path, f'{label}.csv')
+            if os.path.exists(file_path):
+                sources.append((file_path, _opener(file_path, 'csv', label)))
+        return sources
+    if format is None:
+        format = {'.jsonl': 'jsonl', '.csv': 'csv'}\
+            .get(os.path.splitext(path)[1], 'json')
+    label = None
+    if format == 'csv':
+        # a single CSV file is named after its model
+        label = os.path.basename(path)[:-len('.csv')]
+        if label not in MODELS:
+            raise TransferError(f'Cannot tell the model of {path}, name '
+                                f'it one of {", ".join(MODELS)} + .csv.')
+    return [(path, _opener(path, format, label))]
+
+
+def _opener(path, format, label):
+    @contextmanager
+    def open_records():
+        with open(path, newline='' if format == 'csv' else None,
+                  encoding='utf-8') as stream:
+            if format == 'csv':
+                yield iter_csv(stream, label)
+            elif format == 'jsonl':
+                yield iter_jsonl(stream)
+            else:
+                yield iter_json_array(stream)
+    return open_records
+
+
+def _instance(record):
+    label = record['model'].lower()
+    if label not in MODELS:
+        raise TransferError(f'Cannot import records of {record["model"]}.')
+    model = apps.get_model(label)
+    values = {}
+    for field in fields_of(model):
+        if field.name in record['fields']:
+            value = record['fields'][field.name]
+            values[field.attname] = None if value is None \
+                else field.to_python(value)
+    return label, model(pk=model._meta.pk.to_python(record['pk']), **values)
+
+
+class Importer:
+    """Writes records in batches, remembering how far every source got."""
+
+    def __init__(self, batch_size=5000, state_path=None, progress=None):
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.progress = progress
+        self.state = {}
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as file:
+                self.state = json.load(file)
+        self.counts = dict.fromkeys(MODELS, 0)
+        self.votes_imported = False
+        # questions whose result snapshot may be out of date
+        self.questions = set()
+
+    def run(self, sources):
+        """Import every record of the (name, open function) `sources`."""
+        for name, open_records in sources:
+            done = self.state.get(name, 0)
+            pending = {label: [] for label in MODELS}
+            size = 0
+            with open_records() as records:
+                for number, record in enumerate(records, start=1):
+                    if number <= done:
+                        continue
+                    label, instance = _instance(record)
+                    pending[label].append(instance)
+                    size += 1
+                    if size >= self.batch_size:
+                        self._write(pending)
+                        self._save_state(name, number)
+                        pending = {label: [] for label in MODELS}
+                        size = 0
+                if size:
+                    self._write(pending)
+                    self._save_state(name, number)
+        self._finish()
+        return self.counts
+
+    @transaction.atomic
+    def _write(self, pending):
+        for label in MODELS:
+            objects = pending[label]
+            if not objects:
+                continue
+            model = apps.get_model(label)
+            if label == 'polls.vote':
+                self._add_questions(objects)
+                objects = self._latest_votes(objects)
+            # rows already there, from an interrupted run, are skipped
+            stored = set(model.objects
+                         .filter(pk__in=[obj.pk for obj in objects])
+                         .values_list('pk', flat=True))
+            new = [obj for obj in objects if obj.pk not in stored]
+            # and so are rows clashing with another unique field, such as
+            # the username of a user; only the rows written are counted
+            model.objects.bulk_create(new, batch_size=self.batch_size,
+                                      ignore_conflicts=True)
+            self.counts[label] += model.objects\
+                .filter(pk__in=[obj.pk for obj in new]).count()
+        self.questions.update(question.pk
+                              for question in pending['polls.question'])
+        self.questions.update(choice.question_id
+                              for choice in pending['polls.choice'])
+        votes = pending['polls.vote']
+        if votes:
+            self.votes_imported = True
+            self.questions.update(vote.question_id for vote in votes)
+            invalidate_user_votes({vote.user_id for vote in votes})
+        if self.progress:
+            self.progress(self.counts)
+
+    def _latest_votes(self, votes):
+        """
+        Return the latest of the votes of each user for each question, the
+        one with the highest pk, like migration 0012 does, deleting the
+        older votes already stored.
+        """
+        latest = {}
+        for vote in votes:
+            key = (vote.user_id, vote.question_id)
+            if key not in latest or latest[key].pk < vote.pk:
+                latest[key] = vote
+        rows = Vote.objects.filter(
+            user__in={user_id for user_id, _ in latest},
+            question__in={question_id for _, question_id in latest})\
+            .values_list('pk', 'user', 'question')
+        older = []
+        for pk, user_id, question_id in rows:
+            vote = latest.get((user_id, question_id))
+            if vote is None:
+                continue
+            if pk > vote.pk:
+                del latest[user_id, question_id]
+            elif pk < vote.pk:
+                older.append(pk)
+        # without the signals, which would take the votes off counters
+        # that do not count them yet; they are rebuilt at the end
+        votes = Vote.objects.filter(pk__in=older)
+        votes._raw_delete(votes.db)
+        return list(latest.values())
+
+    def _add_questions(self, votes):
+        """Give the votes of older fixtures the question of their choice."""
+        missing = {vote.choice_id for vote in votes
+                   if vote.question_id is None}
+        if not missing:
+            return
+        questions = dict(Choice.objects.filter(pk__in=missing)
+                         .values_list('pk', 'question'))
+        for vote in votes:
+            if vote.question_id is None:
+                try:
+                    vote.question_id = questions[vote.choice_id]
+                except KeyError:
+                    raise TransferError(f'Vote {vote.pk} is for choice '
+                                        f'{vote.choice_id}, which does not '
+                                        'exist.') from None
+
+    def _save_state(self, name, number):
+        if not self.state_path:
+            return
+        self.state[name] = number
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(temporary, self.state_path)
+
+    def _finish(self):
+        if self.votes_imported:
+            with transaction.atomic():
+                Choice.objects.recount_votes()
+        questions = sorted(self.questions)
+        for start in range(0, len(questions), self.batch_size):
+            batch = questions[start:start + self.batch_size]
+            ResultSnapshot.objects.filter(question__in=batch).delete()
+            invalidate_results(batch)
+        invalidate_questions(questions)
+        invalidate_index()
+
+
+@contextmanager
+def deferred_indexes(labels, using='default'):
+    """
+    Drop the Meta.indexes of the models while the block runs and build
+    them once at the end, which is faster than keeping them up to date
+    row by row. Unique constraints and foreign key indexes are kept, the
+    import relies on them. Indexes left dropped by an interrupted run are
+    built too.
+    """
+    connection = connections[using]
+    models = [apps.get_model(label) for label in labels]
+
+    def existing(model):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, model._meta.db_table))
+
+    with connection.schema_editor() as editor:
+        for model in models:
+            names = existing(model)
+            for index in model._meta.indexes:
+                if index.name in names:
+                    editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model in models:
+                names = existing(model)
+                for index in model._meta.indexes:
+                    if index.name not in names:
+                        editor.add_index(model, index)
+
+
+def import_records(sources, batch_size=5000, state_path=None, progress=None,
+                   defer_indexes=False):
+    """
+    Import the records of `sources` (see sources_of()) and return how
+    many records of each model were written.
+    """
+    using = router.db_for_write(Choice)
+    connection = connections[using]
+    importer = Importer(batch_size, state_path, progress)
+    with deferred_indexes(MODELS, using) if defer_indexes \
+            else nullcontext():
+        # like loaddata, check the references once at the end where the
+        # database lets us (SQLite); PostgreSQL defers them to each commit
+        with connection.constraint_checks_disabled():
+            counts = importer.run(sources)
+        models = [apps.get_model(label) for label in MODELS]
+        connection.check_constraints(
+            table_names=[model._meta.db_table for model in models])
+    # the rows came with their pk, move the sequences past them as
+    # loaddata does, or the next rows created would reuse those pks
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    return counts
+
+
+def _records(label, chunk_size):
+    model = apps.get_model(label)
+    names = [field.name for field in fields_of(model)]
+    attnames = [field.attname for field in fields_of(model)]
+    rows = model.objects.order_by('pk')\
+        .values_list('pk', *attnames).iterator(chunk_size=chunk_size)
+    for pk, *values in rows:
+        yield pk, dict(zip(names, values))
+
+
+def export_jsonl(stream, labels=MODELS, chunk_size=2000, progress=None):
+    """Write the records of the models to `stream` as JSON Lines."""
+    counts = {}
+    for label in labels:
+        counts[label] = 0
+        for pk, fields in _records(label, chunk_size):
+            record = {'model': label, 'pk': pk, 'fields': fields}
+            stream.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+            counts[label] += 1
+        if progress:
+            progress(counts)
+    return counts
+
+
+def export_csv(directory, labels=MODELS, chunk_size=2000, progress=None):
+    """Write the records of every model to `<directory>/<model>.csv`."""
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for label in labels:
+        counts[label] = 0
+        names = [field.name for field in fields_of(apps.get_model(label))]
+        path = os.path.join(directory, f'{label}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['pk', *names])
+            for pk, fields in _records(label, chunk_size):
+                writer.writerow([pk, *(
+                    '' if value is None else
+                    value.isoformat() if hasattr(value, 'isoformat')
+                    else value
+                    for value in fields.values())])
+                counts[label] += 1
+        if progress:
+            progress(counts)
+    return counts
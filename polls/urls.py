@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
 
+# async versions of the read-only pages for ASGI servers
+pages = async_views if settings.POLLS_ASYNC_VIEWS else views
+vote = async_views.vote_view if settings.POLLS_ASYNC_VIEWS else views.vote
 
 app_name = 'polls'
 urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
-    path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('', pages.IndexView.as_view(), name='index'),
+    path('all/', views.all_questions, name='all'),
+    path('<int:pk>/', pages.DetailView.as_view(), name='detail'),
+    path('<int:pk>/results/', pages.ResultsView.as_view(), name='results'),
+    path('<int:pk>/results/stream/', views.results_stream,
+         name='results_stream'),
+    path('<int:question_id>/vote/', vote, name='vote'),
+    path('api/questions/', api.questions, name='api_questions'),
+    path('api/questions/<int:pk>/', api.question, name='api_question'),
+    path('api/questions/<int:pk>/results/', api.results,
+         name='api_results'),
+    path('api/questions/<int:pk>/vote/', api.vote, name='api_vote'),
 ]
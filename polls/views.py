@@ -1,38 +1,128 @@
 """This module contains the views of each page of the application."""
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseRedirect
+import asyncio
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, connections
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         StreamingHttpResponse)
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Vote
+from mysite.metrics import VOTES, TimedViewMixin, timed
+from mysite.routers import pin_to_primary
 # from django.contrib.auth.forms import UserCreationForm
 
-from .models import Question, Choice
+from .models import Question
+from .cache import (published_questions, question_bundle, results_version,
+                    user_votes)
+from .events import publisher
+from .http import (has_messages, make_etag, not_modified, private_page,
+                   shared_results)
+from .ingest import get_vote_queue
+from .pagination import InvalidCursor
+from .rendering import question_items
+from .scheduler import get_scheduler
+from .services import cast_vote, question_results
 
 
-class IndexView(generic.ListView):
+class IndexView(TimedViewMixin, generic.ListView):
     """Index page of application."""
 
     template_name = 'polls/index.html'
+    metrics_name = 'polls:index'
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
         """
-        Return the last five published questions (not including those set
-        to be published in the future).
+        Return a page of the published questions (not including those set
+        to be published in the future) from the index cache.
         """
         # return Question.objects.order_by('-pub_date')[:5]
-        return Question.objects.filter(pub_date__lte=timezone.localtime())\
-            .order_by('-pub_date')
+        self.after = self.request.GET.get('after')
+        self.before = self.request.GET.get('before')
+        try:
+            self.index_cache = published_questions(after=self.after,
+                                                   before=self.before)
+        except InvalidCursor:
+            raise Http404('Invalid page of polls.')
+        return self.index_cache.questions
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the cursors and cache stamps of the question page, and the
+        questions of the page the user voted for.
+        """
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'index_cache': self.index_cache,
+            'page': self.index_cache.page,
+            'after': self.after or '',
+            'before': self.before or '',
+            'voted': voted_questions(self.request.user,
+                                     self.index_cache.questions),
+            # only rendered when the page is not in the cache
+            'question_items': lambda: question_items(
+                self.index_cache.questions, self.index_cache.active),
+        })
+        return context
+
+
+def voted_questions(user, questions):
+    """
+    Return the ids of `questions` the user voted for, sorted so that the
+    cached index fragment can vary on them.
+    """
+    if not user.is_authenticated:
+        return ()
+    votes = user_votes(user.pk)
+    return tuple(sorted(q.pk for q in questions if q.pk in votes))
+
+
+def all_questions(request):
+    """Stream the list of every published question in one response."""
+    now = timezone.localtime()
+    chunk_size = settings.POLLS_STREAM_CHUNK_SIZE
+    questions = Question.objects.filter(pub_date__lte=now)\
+        .order_by('-pub_date', '-pk').iterator(chunk_size=chunk_size)
+    # render the page once around a marker and stream the questions
+    # in place of the marker, so the list is never held in memory
+    marker = '<!-- polls:questions -->'
+    page = render_to_string('polls/all.html', {'marker': marker}, request)
+    head, tail = page.split(marker, 1)
+    items = get_template('polls/question_list.html')
+    active = get_scheduler().active_questions(now)
+    voted = user_votes(request.user.pk) \
+        if request.user.is_authenticated else {}
 
+    def stream():
+        yield head
+        offset = 0
+        # a chunk of questions is rendered at once, with the links of its
+        # questions read from the cache at once
+        while chunk := list(islice(questions, chunk_size)):
+            yield items.render({'question_items': question_items(chunk,
+                                                                 active),
+                                'offset': offset, 'voted': voted})
+            offset += len(chunk)
+        yield tail
 
-class DetailView(generic.DetailView):
+    return StreamingHttpResponse(stream())
+
+
+class DetailView(TimedViewMixin, generic.DetailView):
     """Detail page of application."""
 
     model = Question
     template_name = 'polls/detail.html'
+    metrics_name = 'polls:detail'
 
     def get_queryset(self):
         """
@@ -46,9 +136,10 @@ class DetailView(generic.DetailView):
         If not return detail page.
         """
         user = request.user
-        try:
-            question = Question.objects.get(pk=pk)
-        except Question.DoesNotExist:
+        # read the version first, so that it is never newer than the page
+        version = results_version(pk)
+        question = question_bundle(pk)
+        if question is None:
             messages.error(request, 'Question does not exist')
             # redirect back to index page
             return redirect('/')
@@ -61,35 +152,40 @@ class DetailView(generic.DetailView):
             return HttpResponseRedirect(reverse('polls:index'))
         if not user.is_authenticated:
             return redirect('login')
-        try:
-            vote = Vote.objects.get(user=user, choice__question=question)
-            selected_choice = vote.choice.choice_text
-        except Vote.DoesNotExist:
-            selected_choice = ''
-        return render(request, 'polls/detail.html', {
+        etag = None
+        if not has_messages(request):
+            # the form embeds the CSRF token, so the page is only the
+            # same while the CSRF cookie is
+            etag = make_etag('detail', pk, version, user.pk,
+                             request.META.get('CSRF_COOKIE'))
+            response = not_modified(request, etag)
+            if response is not None:
+                return private_page(response, etag)
+        # id of the choice the user voted for, None if not voted yet
+        selected_choice = user_votes(user.pk).get(question.pk)
+        return private_page(render(request, 'polls/detail.html', {
                 'question': question,
+                'choices': question.choice_set.all(),
                 'selected_choice': selected_choice
-            })
+            }), etag)
 
 
-class ResultsView(generic.DetailView):
+class ResultsView(TimedViewMixin, generic.DetailView):
     """Result page of application."""
 
     model = Question
     template_name = 'polls/results.html'
-
-    def get_queryset(self):
-        """
-        Excludes any questions that aren't published yet.
-        """
-        return Question.objects.filter(pub_date__lte=timezone.localtime())
+    metrics_name = 'polls:results'
 
     def get(self, request, pk):
         """Return different pages depend on is_published.
         Redirect index page if question does not exist or
         is_published is false. Return result page"""
         try:
-            question = Question.objects.get(pk=pk)
+            # an ended question comes with its frozen results, and every
+            # question with the version of its results
+            question = Question.objects.select_related('snapshot')\
+                .get(pk=pk)
         except Question.DoesNotExist:
             messages.error(request, 'You cannot go to result \
                            page of the question does not exist')
@@ -99,31 +195,126 @@ class ResultsView(generic.DetailView):
             messages.error(request, 'You cannot watch the result \
                            of unpublished or ended question')
             return HttpResponseRedirect(reverse('polls:index'))
-        return render(request, 'polls/results.html', {'question': question})
+        etag = None
+        # a waiting message is for this user only, do not share the page
+        if not has_messages(request):
+            # the navigation bar shows whether the user is logged in
+            etag = make_etag('results', pk, question.results_version,
+                             request.user.is_authenticated)
+            response = not_modified(request, etag)
+            if response is not None:
+                return shared_results(response, question, etag,
+                                      user_specific=True)
+        response = render(request, 'polls/results.html', {
+                'question': question,
+                'results': question_results(question),
+                'live': live_results(request),
+            })
+        if etag is None:
+            return private_page(response)
+        return shared_results(response, question, etag, user_specific=True)
+
+
+def release_connections():
+    """Close the database connections of this thread not in a transaction."""
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def serves_events(request):
+    """
+    Return whether the results stream can be served to this request: only
+    under ASGI, a WSGI worker would be held for the whole stream.
+    """
+    return isinstance(request, ASGIRequest)
 
 
+def live_results(request):
+    """Return how the results page keeps its counts up to date."""
+    return {'stream': serves_events(request),
+            'poll_interval': settings.POLLS_RESULTS_POLL_INTERVAL}
+
+
+async def results_stream(request, pk):
+    """
+    Stream the vote counts of a question as Server-Sent Events: the
+    current counts, then the new counts after every vote as it commits.
+    Under WSGI it answers 204, which tells the browser not to reconnect;
+    the results page polls instead.
+    """
+    if not serves_events(request):
+        return HttpResponse(status=204)
+    question = await Question.objects.filter(
+        pk=pk, pub_date__lte=timezone.localtime()).afirst()
+    if question is None:
+        raise Http404('Question does not exist')
+    subscription = publisher.subscribe(question.pk)
+    # the first counts are read under the same lock as those of the votes,
+    # so that an older count never follows them
+    await sync_to_async(publisher.publish_current)([question.pk],
+                                                   subscription)
+    # the stream stays open for minutes, do not hold a connection for it
+    await sync_to_async(release_connections)()
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.POLLS_RESULTS_STREAM_TIMEOUT
+        try:
+            while loop.time() < deadline:
+                event = await publisher.next_event(subscription, 15)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'data: {json.dumps(event)}\n\n'
+        finally:
+            publisher.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # tell nginx not to buffer the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@timed('polls:vote')
+@pin_to_primary
 @login_required(login_url="/accounts/login/")
 def vote(request, question_id):
     """Add vote to selected choice of current question."""
     user = request.user
-    question = get_object_or_404(Question, pk=question_id)
+    question = question_bundle(question_id)
+    if question is None:
+        raise Http404('Question does not exist')
+    if question.has_ended():
+        # the results of an ended question are final
+        messages.error(request, 'You cannot vote unpublished \
+                       or ended question')
+        return HttpResponseRedirect(reverse('polls:index'))
+    # the choices come with the cached question
+    choices = {choice.pk: choice for choice in question.choice_set.all()}
     try:
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-    except (KeyError, Choice.DoesNotExist):
+        selected_choice = choices[int(request.POST['choice'])]
+    except (KeyError, ValueError):
         # Redisplay the question voting form.
         messages.error(request, "You didn't select a choice!")
         return render(request, 'polls/detail.html', {
             'question': question,
+            'choices': question.choice_set.all(),
         })
-    try:
-        # find a vote for this user and this question
-        vote = Vote.objects.get(user=user, choice__question=question)
-        # update his/her vote
-        vote.choice = selected_choice
-    except Vote.DoesNotExist:
-        # no matching vote - create a new Vote
-        vote = Vote(user=user, choice=selected_choice)
-    vote.save()
+    if settings.POLLS_VOTE_INGESTION == 'queue':
+        get_vote_queue().put(user.pk, question.pk, selected_choice.pk)
+        VOTES.inc(outcome='queued')
+    else:
+        try:
+            VOTES.inc(outcome=cast_vote(user, selected_choice).kind)
+        except IntegrityError:
+            # the choice was deleted by another process since the
+            # question was cached there
+            messages.error(request, 'This choice no longer exists.')
+            return HttpResponseRedirect(reverse('polls:detail',
+                                                args=(question.id,)))
     messages.info(request, f'You\'re selected {selected_choice}')
     # Always return an HttpResponseRedirect after successfully dealing
     # with POST data. This prevents data from being posted twice if a